@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Callable, Literal
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """Sliding-window breaker that trips on failure rate or slow-call rate, then probes half-open."""
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 10,
+        failure_rate_threshold: float = 0.5,
+        slow_call_ms: float = 4000.0,
+        slow_call_rate_threshold: float = 0.8,
+        open_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_calls = max(1, min_calls)
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_ms = slow_call_ms
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self._clock = clock
+        # Each outcome is (failed, slow).
+        self._outcomes: deque[tuple[bool, bool]] = deque(maxlen=max(1, window))
+        self._state: CircuitState = "closed"
+        self._opened_at = 0.0
+        self._probe_started_at: float | None = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == "open" and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = "half_open"
+            self._probe_started_at = None
+        return self._state
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+
+        if state == "half_open":
+            now = self._clock()
+            # A probe that never reported back (e.g. cancelled) must not wedge the circuit.
+            if self._probe_started_at is None or now - self._probe_started_at >= self.open_seconds:
+                self._probe_started_at = now
+                return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self, duration_ms: float) -> None:
+        slow = duration_ms >= self.slow_call_ms
+        if self.state == "half_open":
+            if slow:
+                self._open()
+            else:
+                self._close()
+            return
+        self._record(False, slow)
+
+    def record_failure(self) -> None:
+        if self.state == "half_open":
+            self._open()
+            return
+        self._record(True, False)
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        self._outcomes.append((failed, slow))
+        if self._state != "closed" or len(self._outcomes) < self.min_calls:
+            return
+
+        total = len(self._outcomes)
+        failures = sum(1 for item_failed, _ in self._outcomes if item_failed)
+        slow_calls = sum(1 for _, item_slow in self._outcomes if item_slow)
+        if failures / total >= self.failure_rate_threshold or slow_calls / total >= self.slow_call_rate_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self._state = "open"
+        self._opened_at = self._clock()
+        self._probe_started_at = None
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def _close(self) -> None:
+        self._state = "closed"
+        self._probe_started_at = None
+        self._outcomes.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        state = self.state
+        total = len(self._outcomes)
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, slow in self._outcomes if slow)
+        return {
+            "state": state,
+            "window_calls": total,
+            "failure_rate": round(failures / total, 3) if total else 0.0,
+            "slow_call_rate": round(slow_calls / total, 3) if total else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_in_ms": max(0, int((self._opened_at + self.open_seconds - self._clock()) * 1000))
+            if state == "open"
+            else 0,
+        }
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Any
+
+
+def _nearest_rank(ordered: list[float], quantile: float) -> float:
+    index = int(round(quantile * len(ordered))) - 1
+    return ordered[min(len(ordered) - 1, max(0, index))]
+
+
+class RollingLatency:
+    """Fixed-size window of recent latencies (ms) with nearest-rank percentiles."""
+
+    def __init__(self, window: int = 512) -> None:
+        self._samples: deque[float] = deque(maxlen=max(1, window))
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, duration_ms: float) -> None:
+        self._samples.append(duration_ms)
+        self.total += 1
+
+    def percentile(self, quantile: float) -> float | None:
+        if not self._samples:
+            return None
+        return _nearest_rank(sorted(self._samples), quantile)
+
+    def stats(self) -> dict[str, Any]:
+        if not self._samples:
+            return {"samples": 0, "total": self.total, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+        ordered = sorted(self._samples)
+        return {
+            "samples": len(ordered),
+            "total": self.total,
+            "p50_ms": round(_nearest_rank(ordered, 0.50), 2),
+            "p95_ms": round(_nearest_rank(ordered, 0.95), 2),
+            "p99_ms": round(_nearest_rank(ordered, 0.99), 2),
+        }
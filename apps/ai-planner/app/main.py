@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-from typing import Any, Literal
+import time
+from typing import Annotated, Any, AsyncIterator, Literal
 
 import httpx
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+from app.circuit_breaker import CircuitBreaker
+from app.latency import RollingLatency
+from app.metrics import Counter, Gauge, Histogram, render_metrics
+from app.plan_cache import PlanCache, plan_cache_key
+from app.single_flight import SingleFlight
+from app.stream_parser import PlanStreamParser
 from app.planner_core import (
     ToolName,
+    build_budgeted_messages,
     choose_tool,
+    choose_tools,
+    compact_prompt,
     fallback_assistant_reply,
     normalize_assistant_reply,
     normalize_tool_name,
@@ -21,6 +33,26 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
 OPENAI_TIMEOUT_MS = int(os.getenv("OPENAI_TIMEOUT_MS", "8000"))
+PLAN_PROMPT_MAX_TOKENS = int(os.getenv("PLAN_PROMPT_MAX_TOKENS", "2000"))
+HTTP_MAX_CONNECTIONS = 200
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 50
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1024"))
+PLAN_CACHE_TTL_MS = int(os.getenv("PLAN_CACHE_TTL_MS", "60000"))
+PLAN_SINGLE_FLIGHT = os.getenv("PLAN_SINGLE_FLIGHT", "true").strip().lower() != "false"
+PLAN_BATCH_CONCURRENCY = max(1, int(os.getenv("PLAN_BATCH_CONCURRENCY", "8")))
+PLAN_DEADLINE_MARGIN_MS = int(os.getenv("PLAN_DEADLINE_MARGIN_MS", "50"))
+OPENAI_HEDGE_ENABLED = os.getenv("OPENAI_HEDGE_ENABLED", "false").strip().lower() == "true"
+OPENAI_HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+OPENAI_HEDGE_MIN_DELAY_MS = int(os.getenv("OPENAI_HEDGE_MIN_DELAY_MS", "50"))
+PLANNER_BREAKER_ENABLED = os.getenv("PLANNER_BREAKER_ENABLED", "true").strip().lower() != "false"
+PLANNER_BREAKER_WINDOW = int(os.getenv("PLANNER_BREAKER_WINDOW", "20"))
+PLANNER_BREAKER_MIN_CALLS = int(os.getenv("PLANNER_BREAKER_MIN_CALLS", "10"))
+PLANNER_BREAKER_FAILURE_RATE = float(os.getenv("PLANNER_BREAKER_FAILURE_RATE", "0.5"))
+PLANNER_BREAKER_SLOW_CALL_MS = int(os.getenv("PLANNER_BREAKER_SLOW_CALL_MS", "4000"))
+PLANNER_BREAKER_SLOW_CALL_RATE = float(os.getenv("PLANNER_BREAKER_SLOW_CALL_RATE", "0.8"))
+PLANNER_BREAKER_OPEN_MS = int(os.getenv("PLANNER_BREAKER_OPEN_MS", "5000"))
+PLANNER_BREAKER_TIMEOUT_FLOOR_MS = int(os.getenv("PLANNER_BREAKER_TIMEOUT_FLOOR_MS", "50"))
+DEADLINE_CANCEL_SLACK_SECONDS = 0.01
 
 class ConversationTurn(BaseModel):
     role: Literal["user", "assistant", "system"]
@@ -30,6 +62,7 @@ class ConversationTurn(BaseModel):
 class PlanRequest(BaseModel):
     latest_user_message: str = Field(min_length=1, max_length=1200)
     conversation_history: list[ConversationTurn] = Field(default_factory=list, max_length=12)
+    use_cache: bool = True
 
 
 class PlanResponse(BaseModel):
@@ -38,10 +71,47 @@ class PlanResponse(BaseModel):
     assistant_reply: str = Field(min_length=1, max_length=1000)
     reasoning: str = Field(min_length=1, max_length=200)
     model: str | None = None
+    prompt_tokens: int | None = None
+
+
+class PlanBatchRequest(BaseModel):
+    requests: list[PlanRequest] = Field(min_length=1, max_length=100)
+
+
+class PlanBatchItem(BaseModel):
+    plan: PlanResponse
+    fallback_reason: str | None = None
+
+
+class PlanBatchResponse(BaseModel):
+    results: list[PlanBatchItem]
 
 
 app = FastAPI(title=f"{APP_NAME} AI Planner", version="0.1.0")
 http_client: httpx.AsyncClient | None = None
+plan_cache = PlanCache(PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_TTL_MS / 1000.0)
+plan_flights: SingleFlight[dict[str, Any] | None] = SingleFlight()
+upstream_latency = RollingLatency()
+hedge_counters = {"sent": 0, "won": 0}
+upstream_circuit = CircuitBreaker(
+    window=PLANNER_BREAKER_WINDOW,
+    min_calls=PLANNER_BREAKER_MIN_CALLS,
+    failure_rate_threshold=PLANNER_BREAKER_FAILURE_RATE,
+    slow_call_ms=PLANNER_BREAKER_SLOW_CALL_MS,
+    slow_call_rate_threshold=PLANNER_BREAKER_SLOW_CALL_RATE,
+    open_seconds=PLANNER_BREAKER_OPEN_MS / 1000.0,
+)
+
+PLAN_DURATION = Histogram("planner_plan_duration_seconds", "Total time to resolve one plan.")
+UPSTREAM_DURATION = Histogram("planner_upstream_duration_seconds", "Upstream chat completion round trip.")
+PARSE_DURATION = Histogram("planner_json_parse_duration_seconds", "Time to decode the upstream body and plan JSON.")
+NORMALIZE_DURATION = Histogram("planner_normalize_duration_seconds", "Time spent in normalize_plan_payload.")
+STREAM_FIRST_TOOL = Histogram("planner_stream_first_tool_seconds", "Time until a streamed plan emits its tool event.")
+PLAN_OUTCOMES = Counter("planner_plans_total", "Plans by outcome (model or fallback reason).", "outcome")
+PLAN_TOOLS = Counter("planner_tool_selected_total", "Plans by chosen tool.", "tool")
+POOL_CONNECTIONS = Gauge("planner_http_pool_connections", "Open connections in the upstream HTTP pool.")
+POOL_IN_USE = Gauge("planner_http_pool_in_use", "Upstream HTTP pool connections currently serving a request.")
+POOL_UTILIZATION = Gauge("planner_http_pool_utilization", "In-use upstream connections over max_connections.")
 
 
 @app.on_event("startup")
@@ -49,7 +119,10 @@ async def startup() -> None:
     global http_client
     # Keep-alive + connection pooling lowers per-request latency under load.
     timeout = httpx.Timeout(OPENAI_TIMEOUT_MS / 1000.0, connect=2.0)
-    limits = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    )
     http_client = httpx.AsyncClient(timeout=timeout, limits=limits)
 
 
@@ -60,48 +133,483 @@ async def shutdown() -> None:
 
 
 @app.get("/health")
-async def health() -> dict[str, str]:
-    return {"status": "ok"}
+async def health() -> dict[str, Any]:
+    return {
+        "status": "ok",
+        "upstream_circuit": upstream_circuit.snapshot() if PLANNER_BREAKER_ENABLED else {"state": "disabled"},
+    }
+
+
+@app.get("/v1/stats")
+async def stats() -> dict[str, Any]:
+    return {
+        "plan_cache": plan_cache.stats(),
+        "single_flight": plan_flights.stats(),
+        "upstream_latency": upstream_latency.stats(),
+        "hedging": {"enabled": OPENAI_HEDGE_ENABLED, **hedge_counters},
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    pool = http_pool_stats()
+    POOL_CONNECTIONS.set(pool["connections"])
+    POOL_IN_USE.set(pool["in_use"])
+    POOL_UTILIZATION.set(round(pool["in_use"] / HTTP_MAX_CONNECTIONS, 4))
+    body = render_metrics(
+        [
+            PLAN_DURATION,
+            UPSTREAM_DURATION,
+            PARSE_DURATION,
+            NORMALIZE_DURATION,
+            STREAM_FIRST_TOOL,
+            PLAN_OUTCOMES,
+            PLAN_TOOLS,
+            POOL_CONNECTIONS,
+            POOL_IN_USE,
+            POOL_UTILIZATION,
+        ]
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+def http_pool_stats() -> dict[str, int]:
+    # httpx does not expose pool occupancy publicly; read httpcore's pool defensively (httpx is pinned
+    # to a minor range in requirements.txt) and report an empty pool if those internals ever move.
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    try:
+        connections = list(getattr(pool, "connections", None) or [])
+        in_use = sum(1 for connection in connections if not getattr(connection, "is_idle", lambda: True)())
+    except Exception:
+        return {"connections": 0, "in_use": 0}
+    return {"connections": len(connections), "in_use": in_use}
 
 
 @app.post("/v1/plan", response_model=PlanResponse)
-async def plan(request: PlanRequest) -> PlanResponse:
+async def plan(
+    request: PlanRequest,
+    deadline_ms: Annotated[int | None, Header(alias="X-Deadline-Ms")] = None,
+) -> PlanResponse:
+    response, _ = await resolve_plan(request, deadline=deadline_from_budget(deadline_ms))
+    return response
+
+
+@app.post("/v1/plan:batch", response_model=PlanBatchResponse)
+async def plan_batch(
+    batch: PlanBatchRequest,
+    deadline_ms: Annotated[int | None, Header(alias="X-Deadline-Ms")] = None,
+) -> PlanBatchResponse:
     if not OPENAI_API_KEY:
-        return build_rule_plan(request.latest_user_message, "openai_key_missing")
+        # No network needed: classify the whole batch in one pass of the rule router.
+        started = time.perf_counter()
+        tools = choose_tools([item.latest_user_message for item in batch.requests])
+        results = []
+        for item, tool in zip(batch.requests, tools):
+            response = build_rule_plan(item.latest_user_message, "openai_key_missing", tool)
+            # Each item counts as one plan, as on /v1/plan, so batch traffic shows up on the same dashboards.
+            record_plan_metrics(response, "openai_key_missing", started)
+            results.append(PlanBatchItem(plan=response, fallback_reason="openai_key_missing"))
+        return PlanBatchResponse(results=results)
+
+    upstream_limit = asyncio.Semaphore(PLAN_BATCH_CONCURRENCY)
+    deadline = deadline_from_budget(deadline_ms)
+    resolved = await asyncio.gather(*(resolve_plan(item, upstream_limit, deadline) for item in batch.requests))
+    return PlanBatchResponse(
+        results=[PlanBatchItem(plan=response, fallback_reason=reason) for response, reason in resolved]
+    )
+
+
+@app.post("/v1/plan:stream")
+async def plan_stream(
+    request: PlanRequest,
+    deadline_ms: Annotated[int | None, Header(alias="X-Deadline-Ms")] = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_plan_events(request, deadline_from_budget(deadline_ms)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    payload = await fetch_openai_plan(request)
+
+async def resolve_plan(
+    request: PlanRequest,
+    upstream_limit: asyncio.Semaphore | None = None,
+    deadline: float | None = None,
+) -> tuple[PlanResponse, str | None]:
+    """Plan one request, returning the response and the fallback reason (None on model success)."""
+    started = time.perf_counter()
+    response, reason = await _resolve_plan(request, upstream_limit, deadline)
+    record_plan_metrics(response, reason, started)
+    return response, reason
+
+
+def record_plan_metrics(response: PlanResponse, reason: str | None, started: float) -> None:
+    PLAN_DURATION.observe(time.perf_counter() - started)
+    PLAN_OUTCOMES.inc(reason or "model")
+    PLAN_TOOLS.inc(response.tool)
+
+
+async def _resolve_plan(
+    request: PlanRequest,
+    upstream_limit: asyncio.Semaphore | None,
+    deadline: float | None,
+) -> tuple[PlanResponse, str | None]:
+    if not OPENAI_API_KEY:
+        return build_rule_plan(request.latest_user_message, "openai_key_missing"), "openai_key_missing"
+
+    messages, prompt_tokens = build_messages(request)
+    response, reason = await _plan_from_messages(request, messages, upstream_limit, deadline)
+    response.prompt_tokens = prompt_tokens
+    return response, reason
+
+
+async def _plan_from_messages(
+    request: PlanRequest,
+    messages: list[dict[str, str]],
+    upstream_limit: asyncio.Semaphore | None,
+    deadline: float | None,
+) -> tuple[PlanResponse, str | None]:
+    use_cache = request.use_cache and plan_cache.enabled
+    fingerprint = plan_cache_key(messages, OPENAI_MODEL) if use_cache or PLAN_SINGLE_FLIGHT else ""
+    early = plan_without_upstream(request, fingerprint, use_cache, deadline)
+    if early is not None:
+        return early
+
+    led = False
+
+    async def fetch() -> dict[str, Any] | None:
+        nonlocal led
+        led = True
+        if upstream_limit is None:
+            return await fetch_openai_plan(messages, deadline)
+        # Only the upstream call holds a concurrency slot; cache hits and coalesced followers do not.
+        async with upstream_limit:
+            return await fetch_openai_plan(messages, deadline)
+
+    for attempt in range(2):
+        # Identical concurrent plans share one upstream call; each caller still normalizes its own copy.
+        upstream = plan_flights.run(fingerprint, fetch) if PLAN_SINGLE_FLIGHT else fetch()
+        try:
+            # A coalesced caller may have a tighter budget than the leader, so enforce it here too.
+            payload = await within_deadline(upstream, deadline)
+        except asyncio.TimeoutError:
+            return build_rule_plan(request.latest_user_message, "python_planner_deadline"), "python_planner_deadline"
+        if payload is not None or led or attempt:
+            break
+        # The shared call failed or ran out of the leader's (possibly shorter) budget. A follower with
+        # time left gets one attempt of its own, unless the cache, its deadline or the breaker says no.
+        early = plan_without_upstream(request, fingerprint, use_cache, deadline)
+        if early is not None:
+            return early
     if payload is None:
         # Service-level fallback keeps routing available even during model/network issues.
-        return build_rule_plan(request.latest_user_message, "python_planner_fallback")
+        return build_rule_plan(request.latest_user_message, "python_planner_fallback"), "python_planner_fallback"
+
+    if use_cache:
+        # Only model answers are cached; fallbacks must retry upstream on the next call.
+        plan_cache.set(fingerprint, payload)
+    return normalize_plan_payload(payload, request.latest_user_message), None
+
+
+async def stream_plan_events(request: PlanRequest, deadline: float | None) -> AsyncIterator[str]:
+    """SSE events: `tool` as soon as it is known, `reply_delta` pieces, then the authoritative `plan`."""
+    started = time.perf_counter()
+    early: tuple[PlanResponse, str | None] | None = None
+    prompt_tokens: int | None = None
+    if not OPENAI_API_KEY:
+        early = build_rule_plan(request.latest_user_message, "openai_key_missing"), "openai_key_missing"
+    elif http_client is None:
+        early = build_rule_plan(request.latest_user_message, "python_planner_fallback"), "python_planner_fallback"
+    else:
+        messages, prompt_tokens = build_messages(request)
+        use_cache = request.use_cache and plan_cache.enabled
+        fingerprint = plan_cache_key(messages, OPENAI_MODEL) if use_cache else ""
+        early = plan_without_upstream(request, fingerprint, use_cache, deadline)
+
+    if early is not None:
+        response, reason = early
+        response.prompt_tokens = prompt_tokens
+        record_plan_metrics(response, reason, started)
+        yield sse_event("tool", {"tool": response.tool})
+        yield sse_event("reply_delta", {"text": response.assistant_reply})
+        yield sse_event("plan", {"plan": response.model_dump(), "fallback_reason": reason})
+        return
+
+    # Streams are not coalesced: every caller needs its own token stream.
+    parser = PlanStreamParser()
+    tool_sent = False
+    reason: str | None = None
+    try:
+        async for content in stream_openai_content(messages, deadline):
+            for kind, value in parser.feed(content):
+                if kind == "tool" and not tool_sent:
+                    tool_sent = True
+                    STREAM_FIRST_TOOL.observe(time.perf_counter() - started)
+                    yield sse_event("tool", {"tool": normalize_tool_name(value, request.latest_user_message)})
+                elif kind == "reply_delta":
+                    yield sse_event("reply_delta", {"text": value})
+    except asyncio.TimeoutError:
+        reason = "python_planner_deadline"
+    except UpstreamError:
+        reason = "python_planner_fallback"
+
+    payload = parse_json_object(parser.text) if reason is None else None
+    if payload is None:
+        # The final plan event is authoritative, so a mid-stream failure still ends with a usable plan.
+        reason = reason or "python_planner_fallback"
+        response = build_rule_plan(request.latest_user_message, reason)
+    else:
+        if use_cache:
+            plan_cache.set(fingerprint, payload)
+        response = normalize_plan_payload(payload, request.latest_user_message)
+
+    response.prompt_tokens = prompt_tokens
+    record_plan_metrics(response, reason, started)
+    if not tool_sent:
+        yield sse_event("tool", {"tool": response.tool})
+    yield sse_event("plan", {"plan": response.model_dump(), "fallback_reason": reason})
+
+
+def sse_event(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def plan_without_upstream(
+    request: PlanRequest,
+    fingerprint: str,
+    use_cache: bool,
+    deadline: float | None,
+) -> tuple[PlanResponse, str | None] | None:
+    """Answer from the cache or the rule planner when an upstream call is unnecessary or pointless."""
+    if use_cache:
+        cached = plan_cache.get(fingerprint)
+        if cached is not None:
+            return normalize_plan_payload(cached, request.latest_user_message), None
+
+    if deadline is not None and deadline <= time.monotonic():
+        return build_rule_plan(request.latest_user_message, "python_planner_deadline"), "python_planner_deadline"
+
+    if PLANNER_BREAKER_ENABLED and not upstream_circuit.allow_request():
+        # Upstream is known-bad: answer from the rule planner instead of waiting on a doomed call.
+        reason = "python_planner_circuit_open"
+        return build_rule_plan(request.latest_user_message, reason), reason
+
+    return None
+
+
+def deadline_from_budget(budget_ms: int | None) -> float | None:
+    if budget_ms is None:
+        return None
+    # Keep a small margin so the rule fallback is serialized before the caller gives up.
+    return time.monotonic() + max(0, budget_ms - PLAN_DEADLINE_MARGIN_MS) / 1000.0
 
-    return normalize_plan_payload(payload, request.latest_user_message)
+
+def hedge_delay_seconds() -> float | None:
+    if not OPENAI_HEDGE_ENABLED or len(upstream_latency) < OPENAI_HEDGE_MIN_SAMPLES:
+        return None
+    p95_ms = upstream_latency.percentile(0.95) or 0.0
+    return max(float(OPENAI_HEDGE_MIN_DELAY_MS), p95_ms) / 1000.0
+
+
+async def fetch_openai_plan(
+    messages: list[dict[str, str]],
+    deadline: float | None = None,
+) -> dict[str, Any] | None:
+    if http_client is None:
+        return None
+
+    timeout = OPENAI_TIMEOUT_MS / 1000.0
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            return None
+
+    hedge_delay = hedge_delay_seconds()
+    if hedge_delay is None or hedge_delay >= timeout:
+        return await request_openai_plan(messages, timeout)
+    return await fetch_hedged_openai_plan(messages, timeout, hedge_delay)
+
+
+async def fetch_hedged_openai_plan(
+    messages: list[dict[str, str]],
+    timeout: float,
+    hedge_delay: float,
+) -> dict[str, Any] | None:
+    primary = asyncio.ensure_future(request_openai_plan(messages, timeout))
+    pending: set[asyncio.Future[dict[str, Any] | None]] = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        # Primary is slower than the rolling p95: race a second request and take the first usable answer.
+        hedge_counters["sent"] += 1
+        hedge = asyncio.ensure_future(request_openai_plan(messages, timeout - hedge_delay))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    if task is hedge:
+                        hedge_counters["won"] += 1
+                    return result
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
 
 
-async def fetch_openai_plan(request: PlanRequest) -> dict[str, Any] | None:
+async def request_openai_plan(messages: list[dict[str, str]], timeout: float) -> dict[str, Any] | None:
     if http_client is None:
         return None
 
+    started = time.perf_counter()
     try:
         response = await http_client.post(
             f"{OPENAI_BASE_URL}/chat/completions",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "X-Application-Name": APP_NAME,
-            },
-            json={
-                "model": OPENAI_MODEL,
-                "temperature": 0.2,
-                "response_format": {"type": "json_object"},
-                "messages": build_messages(request),
-            },
+            headers=openai_headers(),
+            json=openai_request_body(messages),
+            timeout=httpx.Timeout(timeout, connect=min(2.0, timeout)),
         )
+    except httpx.TimeoutException:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_DURATION.observe(elapsed)
+        record_upstream_timeout(timeout, elapsed)
+        return None
+    except asyncio.CancelledError:
+        elapsed = time.perf_counter() - started
+        # The caller's deadline fired alongside our own timeout; a hedge that lost the race stops earlier.
+        if elapsed >= timeout - DEADLINE_CANCEL_SLACK_SECONDS:
+            record_upstream_timeout(timeout, elapsed)
+        raise
     except Exception:
+        UPSTREAM_DURATION.observe(time.perf_counter() - started)
+        record_upstream_failure()
         return None
 
+    elapsed = time.perf_counter() - started
+    UPSTREAM_DURATION.observe(elapsed)
     if response.status_code >= 400:
+        record_upstream_failure()
         return None
+    upstream_latency.record(elapsed * 1000.0)
+    if PLANNER_BREAKER_ENABLED:
+        upstream_circuit.record_success(elapsed * 1000.0)
+
+    parse_started = time.perf_counter()
+    parsed = extract_plan_payload(response)
+    PARSE_DURATION.observe(time.perf_counter() - parse_started)
+    return parsed
+
+
+class UpstreamError(Exception):
+    pass
 
+
+async def stream_openai_content(messages: list[dict[str, str]], deadline: float | None) -> AsyncIterator[str]:
+    """Yield content deltas from a streamed chat completion; raises UpstreamError or asyncio.TimeoutError."""
+    if http_client is None:
+        raise UpstreamError("http client not started")
+
+    timeout = OPENAI_TIMEOUT_MS / 1000.0
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise asyncio.TimeoutError
+
+    started = time.perf_counter()
+    request = http_client.build_request(
+        "POST",
+        f"{OPENAI_BASE_URL}/chat/completions",
+        headers=openai_headers(),
+        json=openai_request_body(messages, stream=True),
+        timeout=httpx.Timeout(timeout, connect=min(2.0, timeout)),
+    )
+    try:
+        # httpx's read timeout restarts on every chunk, so each wait is also bounded by what is left of
+        # the deadline; a slow-dripping upstream cannot run the stream past it.
+        response = await within_deadline(http_client.send(request, stream=True), deadline)
+        try:
+            if response.status_code >= 400:
+                record_upstream_failure()
+                raise UpstreamError(f"upstream status {response.status_code}")
+
+            lines = response.aiter_lines()
+            while True:
+                try:
+                    line = await within_deadline(anext(lines), deadline)
+                except StopAsyncIteration:
+                    break
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                content = extract_stream_delta(data)
+                if content:
+                    yield content
+        finally:
+            await response.aclose()
+    except httpx.TimeoutException as exc:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_DURATION.observe(elapsed)
+        record_upstream_timeout(timeout, elapsed)
+        raise UpstreamError("upstream timeout") from exc
+    except asyncio.TimeoutError:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_DURATION.observe(elapsed)
+        record_upstream_timeout(timeout, elapsed)
+        raise
+    except httpx.HTTPError as exc:
+        record_upstream_failure()
+        raise UpstreamError(str(exc)) from exc
+
+    elapsed = time.perf_counter() - started
+    UPSTREAM_DURATION.observe(elapsed)
+    if PLANNER_BREAKER_ENABLED:
+        upstream_circuit.record_success(elapsed * 1000.0)
+
+
+async def within_deadline(awaitable: Any, deadline: float | None) -> Any:
+    if deadline is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout=deadline - time.monotonic())
+
+
+def extract_stream_delta(data: str) -> str | None:
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return None
+    choices = chunk.get("choices") if isinstance(chunk, dict) else None
+    if not choices:
+        return None
+    content = (choices[0].get("delta") or {}).get("content")
+    return content if isinstance(content, str) else None
+
+
+def openai_headers() -> dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "X-Application-Name": APP_NAME,
+    }
+
+
+def openai_request_body(messages: list[dict[str, str]], stream: bool = False) -> dict[str, Any]:
+    body: dict[str, Any] = {
+        "model": OPENAI_MODEL,
+        "temperature": 0.2,
+        "response_format": {"type": "json_object"},
+        "messages": messages,
+    }
+    if stream:
+        body["stream"] = True
+    return body
+
+
+def extract_plan_payload(response: httpx.Response) -> dict[str, Any] | None:
     try:
         body = response.json()
     except ValueError:
@@ -123,34 +631,53 @@ async def fetch_openai_plan(request: PlanRequest) -> dict[str, Any] | None:
     return parsed
 
 
-def build_messages(request: PlanRequest) -> list[dict[str, str]]:
-    messages: list[dict[str, str]] = [{"role": "system", "content": ASSISTANT_SYSTEM_PROMPT}]
-    for turn in request.conversation_history[-12:]:
-        messages.append({"role": turn.role, "content": truncate(turn.content, 1200)})
+def record_upstream_failure() -> None:
+    if PLANNER_BREAKER_ENABLED:
+        upstream_circuit.record_failure()
+
+
+def record_upstream_timeout(timeout: float, elapsed: float) -> None:
+    """Count a timed-out attempt unless the caller's deadline cut it short before upstream had a fair chance.
 
-    if not request.conversation_history or request.conversation_history[-1].content.strip() != request.latest_user_message.strip():
-        messages.append({"role": "user", "content": truncate(request.latest_user_message, 1200)})
+    Callers send X-Deadline-Ms on every request, so nearly every timeout is deadline-shortened; skipping
+    all of those would leave a hung upstream invisible to the breaker.
+    """
+    floor_ms = min(PLANNER_BREAKER_TIMEOUT_FLOOR_MS, PLANNER_BREAKER_SLOW_CALL_MS)
+    if timeout >= OPENAI_TIMEOUT_MS / 1000.0 or elapsed * 1000.0 >= floor_ms:
+        record_upstream_failure()
 
-    return messages
+
+def build_messages(request: PlanRequest) -> tuple[list[dict[str, str]], int]:
+    """Token-budgeted upstream messages plus their estimated prompt size."""
+    return build_budgeted_messages(
+        COMPACT_SYSTEM_PROMPT,
+        [(turn.role, turn.content) for turn in request.conversation_history[-12:]],
+        request.latest_user_message,
+        PLAN_PROMPT_MAX_TOKENS,
+    )
 
 
 def normalize_plan_payload(payload: dict[str, Any], original_message: str) -> PlanResponse:
+    started = time.perf_counter()
     tool = normalize_tool_name(payload.get("tool"), original_message)
     tool_input = payload.get("tool_input")
     assistant_reply = payload.get("assistant_reply")
     reasoning = payload.get("reasoning")
 
-    return PlanResponse(
+    response = PlanResponse(
         tool=tool,
         tool_input=tool_input if isinstance(tool_input, dict) else {},
         assistant_reply=normalize_assistant_reply(assistant_reply, tool),
         reasoning=reasoning if isinstance(reasoning, str) else "python_planner",
         model=OPENAI_MODEL,
     )
+    NORMALIZE_DURATION.observe(time.perf_counter() - started)
+    return response
 
 
-def build_rule_plan(message: str, reason: str) -> PlanResponse:
-    tool = choose_tool(message)
+def build_rule_plan(message: str, reason: str, tool: ToolName | None = None) -> PlanResponse:
+    if tool is None:
+        tool = choose_tool(message)
     return PlanResponse(
         tool=tool,
         tool_input={"raw_message": truncate(message, 300)},
@@ -191,3 +718,6 @@ Routing guidelines:
 - Keep assistant_reply concise and professional.
 - Never include markdown, code fences, or any text outside the JSON object.
 """.strip()
+
+# Same instructions without indentation or blank lines; sent on every upstream call.
+COMPACT_SYSTEM_PROMPT = compact_prompt(ASSISTANT_SYSTEM_PROMPT)
@@ -1,22 +1,48 @@
 from __future__ import annotations
 
+import re
 from typing import Any, Literal
 
 
 ToolName = Literal["check_availability", "book_appointment", "create_ticket", "handoff_to_human"]
 
+# Ordered by precedence: the first rule with any keyword in the message wins.
+TOOL_KEYWORD_RULES: tuple[tuple[ToolName, tuple[str, ...]], ...] = (
+    ("book_appointment", ("schedule", "book", "reschedule")),
+    ("check_availability", ("availability", "open", "hours")),
+    ("create_ticket", ("ticket", "issue", "bug", "problem")),
+    ("handoff_to_human", ("human", "agent", "escalate")),
+)
+DEFAULT_TOOL: ToolName = "check_availability"
+
+
+def _compile_keyword_table(
+    rules: tuple[tuple[ToolName, tuple[str, ...]], ...],
+) -> tuple[tuple[str, ToolName], ...]:
+    table: list[tuple[str, ToolName]] = []
+    for tool, keywords in rules:
+        for keyword in keywords:
+            # A keyword containing an earlier one can never be the first hit ("reschedule" vs "schedule").
+            if any(earlier in keyword for earlier, _ in table):
+                continue
+            table.append((keyword, tool))
+    return tuple(table)
+
+
+_KEYWORD_TABLE = _compile_keyword_table(TOOL_KEYWORD_RULES)
+
 
 def choose_tool(message: str) -> ToolName:
     text = message.lower()
-    if "schedule" in text or "book" in text or "reschedule" in text:
-        return "book_appointment"
-    if "availability" in text or "open" in text or "hours" in text:
-        return "check_availability"
-    if "ticket" in text or "issue" in text or "bug" in text or "problem" in text:
-        return "create_ticket"
-    if "human" in text or "agent" in text or "escalate" in text:
-        return "handoff_to_human"
-    return "check_availability"
+    # Table order is rule precedence, so the first keyword present decides the tool.
+    for keyword, tool in _KEYWORD_TABLE:
+        if keyword in text:
+            return tool
+    return DEFAULT_TOOL
+
+
+def choose_tools(messages: list[str]) -> list[ToolName]:
+    return [choose_tool(message) for message in messages]
 
 
 def normalize_tool_name(value: Any, original_message: str) -> ToolName:
@@ -47,6 +73,80 @@ def fallback_assistant_reply(tool: ToolName) -> str:
     return "I can help with that. I am checking current availability now."
 
 
+# Rough BPE stand-in: words cost one token per ~6 chars, punctuation one each.
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+MESSAGE_TOKEN_OVERHEAD = 4
+SUMMARY_SNIPPET_CHARS = 80
+SUMMARY_MAX_SNIPPETS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 + (len(piece) - 1) // 6 for piece in _TOKEN_PIECES.findall(text))
+
+
+def estimate_message_tokens(message: dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+
+
+def compact_text(value: str) -> str:
+    return " ".join(value.split())
+
+
+def compact_prompt(prompt: str) -> str:
+    return "\n".join(line.strip() for line in prompt.splitlines() if line.strip())
+
+
+def build_budgeted_messages(
+    system_prompt: str,
+    turns: list[tuple[str, str]],
+    latest_user_message: str,
+    max_tokens: int,
+    max_turn_chars: int = 1200,
+) -> tuple[list[dict[str, str]], int]:
+    """Newest-first history that fits max_tokens; returns messages and their estimated prompt tokens."""
+    compacted = [(role, compact_text(truncate(content, max_turn_chars))) for role, content in turns]
+    if not turns or turns[-1][1].strip() != latest_user_message.strip():
+        compacted.append(("user", compact_text(truncate(latest_user_message, max_turn_chars))))
+
+    system = {"role": "system", "content": system_prompt}
+    latest = {"role": compacted[-1][0], "content": compacted[-1][1]}
+    used = estimate_message_tokens(system) + estimate_message_tokens(latest)
+
+    kept: list[dict[str, str]] = []
+    seen_assistant: set[str] = set()
+    older = compacted[:-1]
+    cutoff = 0
+    for index in range(len(older) - 1, -1, -1):
+        role, content = older[index]
+        if role == "assistant":
+            # Repeated assistant text (mostly fallback boilerplate) only needs to appear once.
+            if content in seen_assistant:
+                continue
+            seen_assistant.add(content)
+        message = {"role": role, "content": content}
+        cost = estimate_message_tokens(message)
+        if used + cost > max_tokens:
+            cutoff = index + 1
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+
+    messages = [system]
+    dropped_user = [content for role, content in older[:cutoff] if role == "user"]
+    if dropped_user:
+        snippets = [truncate(content, SUMMARY_SNIPPET_CHARS) for content in dropped_user[-SUMMARY_MAX_SNIPPETS:]]
+        summary = {"role": "system", "content": "Earlier user messages (condensed): " + " | ".join(snippets)}
+        summary_cost = estimate_message_tokens(summary)
+        if used + summary_cost <= max_tokens:
+            messages.append(summary)
+            used += summary_cost
+
+    messages.extend(kept)
+    messages.append(latest)
+    return messages, used
+
+
 def truncate(value: str, max_length: int) -> str:
     if len(value) <= max_length:
         return value
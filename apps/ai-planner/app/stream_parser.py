@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from typing import Literal
+
+StreamEvent = tuple[Literal["tool", "reply_delta"], str]
+
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PlanStreamParser:
+    """Incremental scan of streamed plan JSON: emits the top-level tool and assistant_reply pieces early."""
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._unicode_digits: str | None = None
+        self._high_surrogate: int | None = None
+        self._expecting_key = False
+        self._string_is_key = False
+        self._current_key = ""
+        self._buffer: list[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> list[StreamEvent]:
+        self._chunks.append(chunk)
+        events: list[StreamEvent] = []
+        reply_piece: list[str] = []
+
+        for char in chunk:
+            if self._in_string:
+                decoded = self._consume_string_char(char)
+                if decoded is None:
+                    continue
+                if decoded == "":
+                    # Closing quote.
+                    self._in_string = False
+                    value = "".join(self._buffer)
+                    if self._string_is_key:
+                        self._current_key = value
+                    elif self._depth == 1 and self._current_key == "tool":
+                        events.append(("tool", value))
+                    continue
+                if self._tracks_reply():
+                    reply_piece.append(decoded)
+                elif self._string_is_key or self._current_key == "tool":
+                    self._buffer.append(decoded)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._buffer = []
+                self._string_is_key = self._depth == 1 and self._expecting_key
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expecting_key = True
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and char == ":":
+                self._expecting_key = False
+            elif self._depth == 1 and char == ",":
+                self._expecting_key = True
+                self._current_key = ""
+
+        if reply_piece:
+            events.append(("reply_delta", "".join(reply_piece)))
+        return events
+
+    def _tracks_reply(self) -> bool:
+        return self._depth == 1 and not self._string_is_key and self._current_key == "assistant_reply"
+
+    def _consume_string_char(self, char: str) -> str | None:
+        """Return decoded text, "" for the closing quote, or None while an escape is pending."""
+        if self._unicode_digits is not None:
+            self._unicode_digits += char
+            if len(self._unicode_digits) < 4:
+                return None
+            try:
+                code = int(self._unicode_digits, 16)
+            except ValueError:
+                code = 0xFFFD
+            self._unicode_digits = None
+            if 0xD800 <= code <= 0xDBFF:
+                self._high_surrogate = code
+                return None
+            if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+                code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self._high_surrogate = None
+            return chr(code)
+
+        if self._escape:
+            self._escape = False
+            if char == "u":
+                self._unicode_digits = ""
+                return None
+            return _SIMPLE_ESCAPES.get(char, char)
+
+        if char == "\\":
+            self._escape = True
+            return None
+        if char == '"':
+            return ""
+        return char
@@ -0,0 +1,46 @@
+"""Micro-benchmarks for the planner hot path.
+
+Run with: python -m pytest benchmarks/bench_planner_core.py
+"""
+
+import json
+import pathlib
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+SERVICE_DIR = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+
+from app.main import normalize_plan_payload, parse_json_object  # noqa: E402
+from app.planner_core import choose_tool, choose_tools  # noqa: E402
+
+SHORT_MESSAGE = "what are your hours"
+LONG_MESSAGE = "Hi, I wanted to ask about something that happened with my order yesterday, can you help? " * 4
+PLAN_PAYLOAD = {
+    "tool": "book_appointment",
+    "tool_input": {"date": "2026-02-12", "time": "10:00"},
+    "assistant_reply": "I can book that for you now.",
+    "reasoning": "user asked to schedule",
+}
+PLAN_JSON = json.dumps(PLAN_PAYLOAD)
+
+
+@pytest.mark.parametrize("message", [SHORT_MESSAGE, LONG_MESSAGE], ids=["short", "long_no_match"])
+def test_choose_tool(benchmark, message: str) -> None:
+    benchmark(choose_tool, message)
+
+
+def test_choose_tools_batch(benchmark) -> None:
+    messages = [SHORT_MESSAGE, LONG_MESSAGE, "book me in", "I found a bug"] * 25
+    benchmark(choose_tools, messages)
+
+
+def test_normalize_plan_payload(benchmark) -> None:
+    benchmark(normalize_plan_payload, PLAN_PAYLOAD, "book me for tuesday")
+
+
+def test_parse_json_object(benchmark) -> None:
+    benchmark(parse_json_object, PLAN_JSON)
@@ -0,0 +1,150 @@
+"""Concurrency load harness for /v1/plan.
+
+Runs the planner app in-process (ASGI transport, real httpx pool to the
+upstream) against a local mock OpenAI-compatible server and reports latency
+percentiles and throughput per concurrency level.
+
+    python benchmarks/load_harness.py --concurrency 1 8 32 --requests 400 --latency-ms 150 --error-rate 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import pathlib
+import socket
+import sys
+import time
+from collections import Counter
+from typing import Any
+
+import httpx
+import uvicorn
+
+SERVICE_DIR = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+
+from app import main  # noqa: E402
+from benchmarks.mock_openai import create_mock_openai_app  # noqa: E402
+
+MESSAGES = [
+    "book an appointment",
+    "what are your hours",
+    "I have a billing issue",
+    "can I talk to a human",
+    "is there availability tomorrow morning",
+]
+
+
+def percentile(ordered: list[float], quantile: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(quantile * len(ordered))) - 1))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    total_requests: int,
+    repeat_messages: bool,
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    outcomes: Counter[str] = Counter()
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < total_requests:
+            index = next_index
+            next_index += 1
+            message = MESSAGES[index % len(MESSAGES)]
+            if not repeat_messages:
+                # Unique text keeps the plan cache and single-flight from hiding upstream cost.
+                message = f"{message} (request {index})"
+            started = time.perf_counter()
+            response = await client.post("/v1/plan", json={"latest_user_message": message})
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            if response.status_code != 200:
+                outcomes[f"http_{response.status_code}"] += 1
+            else:
+                reasoning = response.json()["reasoning"]
+                outcomes[reasoning if reasoning.startswith(("python_planner", "openai_key")) else "model"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50), 2),
+        "p95_ms": round(percentile(ordered, 0.95), 2),
+        "p99_ms": round(percentile(ordered, 0.99), 2),
+        "outcomes": dict(outcomes),
+    }
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    port = free_port()
+    mock_app = create_mock_openai_app(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    server = uvicorn.Server(uvicorn.Config(mock_app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    main.OPENAI_API_KEY = "load-test"
+    main.OPENAI_BASE_URL = f"http://127.0.0.1:{port}"
+    await main.startup()
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://planner", timeout=60.0) as client:
+            for concurrency in args.concurrency:
+                main.plan_cache.clear()
+                results.append(await run_level(client, concurrency, args.requests, args.repeat_messages))
+    finally:
+        await main.shutdown()
+        server.should_exit = True
+        await server_task
+    return results
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=500, help="requests per concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="mock upstream base latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="uniform +/- jitter on upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls returning 503")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat-messages", action="store_true", help="reuse a few messages (exercises the cache)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'conc':>5} {'reqs':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  outcomes")
+    for row in results:
+        print(
+            f"{row['concurrency']:>5} {row['requests']:>6} {row['throughput_rps']:>9} "
+            f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}  {row['outcomes']}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,40 @@
+"""OpenAI-compatible /chat/completions stub with configurable latency and error rate."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+MOCK_PLAN = {
+    "tool": "check_availability",
+    "tool_input": {"date": "tomorrow"},
+    "assistant_reply": "I can help with that. Checking availability now.",
+    "reasoning": "mock_upstream",
+}
+
+
+def create_mock_openai_app(
+    latency_ms: float = 200.0,
+    jitter_ms: float = 50.0,
+    error_rate: float = 0.0,
+    seed: int | None = None,
+) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI")
+    rng = random.Random(seed)
+    app.state.requests = 0
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request) -> JSONResponse:
+        app.state.requests += 1
+        await request.body()
+        delay_ms = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms))
+        await asyncio.sleep(delay_ms / 1000.0)
+        if rng.random() < error_rate:
+            return JSONResponse({"error": {"message": "mock upstream failure"}}, status_code=503)
+        return JSONResponse({"choices": [{"message": {"role": "assistant", "content": json.dumps(MOCK_PLAN)}}]})
+
+    return app
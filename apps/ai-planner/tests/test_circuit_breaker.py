@@ -0,0 +1,77 @@
+import pathlib
+import sys
+import unittest
+
+APP_DIR = pathlib.Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from circuit_breaker import CircuitBreaker  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            window=4,
+            min_calls=4,
+            failure_rate_threshold=0.5,
+            slow_call_ms=1000,
+            slow_call_rate_threshold=0.75,
+            open_seconds=5,
+            clock=self.clock,
+        )
+
+    def test_trips_on_failure_rate_once_window_is_full(self) -> None:
+        self.breaker.record_success(10)
+        self.breaker.record_failure()
+        self.breaker.record_success(10)
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()["rejected"], 1)
+
+    def test_trips_on_slow_call_rate(self) -> None:
+        for _ in range(3):
+            self.breaker.record_success(1500)
+        self.breaker.record_success(10)
+
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_half_open_allows_one_probe_and_closes_on_success(self) -> None:
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now = 5.0
+
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success(10)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_reopens_circuit(self) -> None:
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now = 5.0
+        self.breaker.allow_request()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.snapshot()["times_opened"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+import asyncio
+import pathlib
+import sys
+import time
+import unittest
+import json
+from typing import Any, AsyncIterator
+
+import httpx
+
+SERVICE_DIR = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+
+from app import main  # noqa: E402
+
+
+class PlanEndpointTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.original_key = main.OPENAI_API_KEY
+        self.original_fetch = main.fetch_openai_plan
+        self.upstream_calls: list[list[dict[str, str]]] = []
+        main.plan_cache.clear()
+
+    def tearDown(self) -> None:
+        main.OPENAI_API_KEY = self.original_key
+        main.fetch_openai_plan = self.original_fetch
+        main.plan_cache.clear()
+
+    def use_fake_upstream(self, payload: dict[str, Any] | None, delay: float = 0.0) -> None:
+        async def fake_fetch(
+            messages: list[dict[str, str]],
+            deadline: float | None = None,
+        ) -> dict[str, Any] | None:
+            self.upstream_calls.append(messages)
+            await asyncio.sleep(delay)
+            return payload
+
+        main.OPENAI_API_KEY = "test-key"
+        main.fetch_openai_plan = fake_fetch
+
+    async def test_repeat_plan_is_served_from_cache(self) -> None:
+        self.use_fake_upstream({"tool": "book_appointment", "assistant_reply": "Sure.", "reasoning": "model"})
+
+        first = await main.plan(main.PlanRequest(latest_user_message="Book an appointment"))
+        second = await main.plan(main.PlanRequest(latest_user_message="book an appointment"))
+        bypass = await main.plan(main.PlanRequest(latest_user_message="book an appointment", use_cache=False))
+
+        self.assertEqual(first, second)
+        self.assertEqual(bypass.tool, "book_appointment")
+        self.assertEqual(len(self.upstream_calls), 2)
+
+    async def test_upstream_failure_uses_rule_fallback_and_is_not_cached(self) -> None:
+        self.use_fake_upstream(None)
+
+        response = await main.plan(main.PlanRequest(latest_user_message="I found a bug"))
+        await main.plan(main.PlanRequest(latest_user_message="I found a bug"))
+
+        self.assertEqual(response.tool, "create_ticket")
+        self.assertEqual(response.reasoning, "python_planner_fallback")
+        self.assertEqual(len(self.upstream_calls), 2)
+
+    async def test_batch_without_key_resolves_inline_in_order(self) -> None:
+        main.OPENAI_API_KEY = ""
+        batch = main.PlanBatchRequest(
+            requests=[
+                main.PlanRequest(latest_user_message="get me a human"),
+                main.PlanRequest(latest_user_message="reschedule please"),
+            ]
+        )
+
+        outcomes_before = main.PLAN_OUTCOMES.value("openai_key_missing")
+        durations_before = main.PLAN_DURATION.count
+
+        response = await main.plan_batch(batch)
+
+        self.assertEqual([item.plan.tool for item in response.results], ["handoff_to_human", "book_appointment"])
+        self.assertTrue(all(item.fallback_reason == "openai_key_missing" for item in response.results))
+        self.assertEqual(main.PLAN_OUTCOMES.value("openai_key_missing"), outcomes_before + 2)
+        self.assertEqual(main.PLAN_DURATION.count, durations_before + 2)
+
+    async def test_batch_fans_out_and_reports_per_item_fallbacks(self) -> None:
+        async def fake_fetch(
+            messages: list[dict[str, str]],
+            deadline: float | None = None,
+        ) -> dict[str, Any] | None:
+            await asyncio.sleep(0.01)
+            if "bug" in messages[-1]["content"]:
+                return None
+            return {"tool": "check_availability", "assistant_reply": "Open 9-5.", "reasoning": "model"}
+
+        main.OPENAI_API_KEY = "test-key"
+        main.fetch_openai_plan = fake_fetch
+        batch = main.PlanBatchRequest(
+            requests=[
+                main.PlanRequest(latest_user_message="what are your hours", use_cache=False),
+                main.PlanRequest(latest_user_message="there is a bug", use_cache=False),
+            ]
+        )
+
+        response = await main.plan_batch(batch)
+
+        self.assertEqual([item.fallback_reason for item in response.results], [None, "python_planner_fallback"])
+        self.assertEqual(response.results[0].plan.assistant_reply, "Open 9-5.")
+        self.assertEqual(response.results[1].plan.tool, "create_ticket")
+
+    async def test_deadline_header_falls_back_before_upstream_answers(self) -> None:
+        self.use_fake_upstream({"tool": "book_appointment"}, delay=0.5)
+
+        response = await main.plan(main.PlanRequest(latest_user_message="book me", use_cache=False), deadline_ms=60)
+
+        self.assertEqual(response.reasoning, "python_planner_deadline")
+        self.assertEqual(response.tool, "book_appointment")
+
+    async def test_follower_with_longer_deadline_retries_after_the_leader_runs_out(self) -> None:
+        deadlines: list[float | None] = []
+
+        async def deadline_bound_fetch(
+            messages: list[dict[str, str]],
+            deadline: float | None = None,
+        ) -> dict[str, Any] | None:
+            deadlines.append(deadline)
+            if deadline is not None and deadline - time.monotonic() < 0.1:
+                await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+                return None
+            await asyncio.sleep(0.1)
+            return {"tool": "book_appointment", "assistant_reply": "Booked.", "reasoning": "model"}
+
+        main.OPENAI_API_KEY = "test-key"
+        main.fetch_openai_plan = deadline_bound_fetch
+        request = main.PlanRequest(latest_user_message="book me", use_cache=False)
+
+        leader, follower = await asyncio.gather(
+            main.plan(request, deadline_ms=100),
+            main.plan(request, deadline_ms=1000),
+        )
+
+        self.assertEqual(leader.reasoning, "python_planner_deadline")
+        self.assertEqual(follower.reasoning, "model")
+        self.assertEqual(len(deadlines), 2)
+
+    async def test_metrics_count_outcomes_and_tools(self) -> None:
+        self.use_fake_upstream({"tool": "create_ticket", "assistant_reply": "Logged."})
+        before = main.PLAN_OUTCOMES.value("model")
+
+        await main.plan(main.PlanRequest(latest_user_message="ticket please", use_cache=False))
+        body = (await main.metrics()).body.decode()
+
+        self.assertEqual(main.PLAN_OUTCOMES.value("model"), before + 1)
+        self.assertIn('planner_tool_selected_total{tool="create_ticket"}', body)
+        self.assertIn("planner_plan_duration_seconds_count", body)
+
+    async def test_pool_stats_survive_missing_httpx_internals(self) -> None:
+        original_client = main.http_client
+        main.http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda _: httpx.Response(200)))
+        try:
+            stats = main.http_pool_stats()
+            main.http_client._transport._pool = type("Pool", (), {"connections": [object()]})()
+            changed = main.http_pool_stats()
+        finally:
+            await main.http_client.aclose()
+            main.http_client = original_client
+
+        self.assertEqual(stats, {"connections": 0, "in_use": 0})
+        self.assertEqual(changed, {"connections": 1, "in_use": 0})
+
+    async def test_open_circuit_skips_upstream(self) -> None:
+        self.use_fake_upstream({"tool": "book_appointment"})
+        original_circuit = main.upstream_circuit
+        main.upstream_circuit = main.CircuitBreaker(window=1, min_calls=1, open_seconds=60)
+        main.upstream_circuit.record_failure()
+        try:
+            response = await main.plan(main.PlanRequest(latest_user_message="book me", use_cache=False))
+            health = await main.health()
+        finally:
+            main.upstream_circuit = original_circuit
+
+        self.assertEqual(response.reasoning, "python_planner_circuit_open")
+        self.assertEqual(self.upstream_calls, [])
+        self.assertEqual(health["upstream_circuit"]["state"], "open")
+
+
+class DeadlineBreakerTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        async def hung_upstream(request: httpx.Request) -> httpx.Response:
+            # MockTransport does not enforce timeouts, so behave like a real transport would on a hang.
+            await asyncio.sleep(request.extensions["timeout"]["read"])
+            raise httpx.ReadTimeout("upstream hung", request=request)
+
+        self.original = (main.http_client, main.OPENAI_API_KEY, main.upstream_circuit)
+        main.http_client = httpx.AsyncClient(transport=httpx.MockTransport(hung_upstream))
+        main.OPENAI_API_KEY = "test-key"
+        main.upstream_circuit = main.CircuitBreaker(window=10, min_calls=4, open_seconds=60)
+        main.plan_cache.clear()
+
+    async def asyncTearDown(self) -> None:
+        await main.http_client.aclose()
+        main.http_client, main.OPENAI_API_KEY, main.upstream_circuit = self.original
+
+    async def test_deadline_shortened_timeouts_trip_the_breaker(self) -> None:
+        reasons = []
+        for _ in range(6):
+            response = await main.plan(main.PlanRequest(latest_user_message="book me", use_cache=False), deadline_ms=150)
+            reasons.append(response.reasoning)
+            # Let the shared upstream attempt finish timing out before the next request.
+            await asyncio.sleep(0.02)
+
+        self.assertEqual(reasons[:4], ["python_planner_deadline"] * 4)
+        self.assertEqual(reasons[-1], "python_planner_circuit_open")
+        self.assertEqual(main.upstream_circuit.snapshot()["state"], "open")
+
+    async def test_attempt_cut_short_before_the_floor_is_not_counted(self) -> None:
+        main.record_upstream_timeout(timeout=0.01, elapsed=0.01)
+        self.assertEqual(main.upstream_circuit.snapshot()["window_calls"], 0)
+
+        main.record_upstream_timeout(timeout=0.2, elapsed=0.2)
+        self.assertEqual(main.upstream_circuit.snapshot()["window_calls"], 1)
+
+
+class HedgedRequestTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.attempts = 0
+
+        async def handler(_: httpx.Request) -> httpx.Response:
+            self.attempts += 1
+            if self.attempts == 1:
+                await asyncio.sleep(0.5)
+            content = json.dumps({"tool": "create_ticket", "assistant_reply": f"attempt {self.attempts}"})
+            return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+        self.original = (main.http_client, main.OPENAI_HEDGE_ENABLED, main.upstream_latency)
+        main.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        main.OPENAI_HEDGE_ENABLED = True
+        main.upstream_latency = main.RollingLatency()
+        for _ in range(main.OPENAI_HEDGE_MIN_SAMPLES):
+            main.upstream_latency.record(20.0)
+
+    async def asyncTearDown(self) -> None:
+        await main.http_client.aclose()
+        main.http_client, main.OPENAI_HEDGE_ENABLED, main.upstream_latency = self.original
+
+    async def test_slow_primary_is_hedged_and_first_answer_wins(self) -> None:
+        sent_before = main.hedge_counters["sent"]
+
+        payload = await main.fetch_openai_plan([{"role": "user", "content": "bug"}])
+
+        self.assertEqual(payload, {"tool": "create_ticket", "assistant_reply": "attempt 2"})
+        self.assertEqual(main.hedge_counters["sent"], sent_before + 1)
+
+
+class StreamingPlanTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        plan_text = '{"tool": "book_appointment", "assistant_reply": "Booking you in now.", "reasoning": "model"}'
+        pieces = [plan_text[index : index + 7] for index in range(0, len(plan_text), 7)]
+        lines = [f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}" for piece in pieces]
+        sse_body = "\n\n".join(lines + ["data: [DONE]"]) + "\n\n"
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.assertTrue(json.loads(request.content)["stream"])
+            return httpx.Response(200, text=sse_body, headers={"Content-Type": "text/event-stream"})
+
+        self.original = (main.http_client, main.OPENAI_API_KEY)
+        main.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        main.OPENAI_API_KEY = "test-key"
+
+    async def asyncTearDown(self) -> None:
+        await main.http_client.aclose()
+        main.http_client, main.OPENAI_API_KEY = self.original
+
+    async def test_stream_emits_tool_before_reply_and_ends_with_plan(self) -> None:
+        request = main.PlanRequest(latest_user_message="book me in", use_cache=False)
+
+        events = [event async for event in main.stream_plan_events(request, None)]
+
+        names = [event.split("\n", 1)[0].removeprefix("event: ") for event in events]
+        self.assertEqual(names[0], "tool")
+        self.assertEqual(names[-1], "plan")
+        self.assertIn("reply_delta", names)
+        replies = [json.loads(event.split("data: ", 1)[1])["text"] for event in events if "reply_delta" in event]
+        self.assertEqual("".join(replies), "Booking you in now.")
+        final = json.loads(events[-1].split("data: ", 1)[1])
+        self.assertIsNone(final["fallback_reason"])
+        self.assertEqual(final["plan"]["tool"], "book_appointment")
+
+
+class StalledStreamTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        first = json.dumps({"choices": [{"delta": {"content": '{"tool": "create_ticket", '}}]})
+
+        async def stalling_body() -> AsyncIterator[bytes]:
+            yield f"data: {first}\n\n".encode()
+            # Each read stays under httpx's per-chunk read timeout, but the stream as a whole never ends.
+            await asyncio.sleep(3)
+            yield b"data: [DONE]\n\n"
+
+        def handler(_: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=stalling_body(), headers={"Content-Type": "text/event-stream"})
+
+        self.original = (main.http_client, main.OPENAI_API_KEY)
+        main.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        main.OPENAI_API_KEY = "test-key"
+
+    async def asyncTearDown(self) -> None:
+        await main.http_client.aclose()
+        main.http_client, main.OPENAI_API_KEY = self.original
+
+    async def test_stalled_stream_falls_back_at_the_deadline(self) -> None:
+        request = main.PlanRequest(latest_user_message="there is a bug", use_cache=False)
+        before = main.PLAN_OUTCOMES.value("python_planner_deadline")
+        started = time.monotonic()
+
+        events = [event async for event in main.stream_plan_events(request, main.deadline_from_budget(500))]
+
+        self.assertLess(time.monotonic() - started, 1.0)
+        final = json.loads(events[-1].split("data: ", 1)[1])
+        self.assertEqual(final["fallback_reason"], "python_planner_deadline")
+        self.assertEqual(final["plan"]["tool"], "create_ticket")
+        self.assertEqual(main.PLAN_OUTCOMES.value("python_planner_deadline"), before + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
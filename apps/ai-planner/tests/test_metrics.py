@@ -0,0 +1,40 @@
+import pathlib
+import sys
+import unittest
+
+APP_DIR = pathlib.Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from metrics import Counter, Gauge, Histogram, render_metrics  # noqa: E402
+
+
+class MetricsTests(unittest.TestCase):
+    def test_histogram_renders_cumulative_buckets(self) -> None:
+        histogram = Histogram("plan_seconds", "Plan latency.", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(3.0)
+
+        lines = list(histogram.render())
+
+        self.assertIn('plan_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('plan_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('plan_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("plan_seconds_count 3", lines)
+
+    def test_counter_renders_one_series_per_label(self) -> None:
+        counter = Counter("plans_total", "Plans.", "outcome")
+        counter.inc("model")
+        counter.inc("model")
+        counter.inc("python_planner_fallback")
+
+        body = render_metrics([counter, Gauge("pool_in_use", "In use.")])
+
+        self.assertIn('plans_total{outcome="model"} 2', body)
+        self.assertIn('plans_total{outcome="python_planner_fallback"} 1', body)
+        self.assertIn("# TYPE pool_in_use gauge", body)
+        self.assertTrue(body.endswith("\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import pathlib
+import sys
+import unittest
+
+APP_DIR = pathlib.Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from plan_cache import PlanCache, plan_cache_key  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class PlanCacheTests(unittest.TestCase):
+    def test_key_ignores_case_and_whitespace(self) -> None:
+        first = plan_cache_key([{"role": "user", "content": "Book an  appointment"}], "gpt-4.1-mini")
+        second = plan_cache_key([{"role": "user", "content": " book an appointment "}], "gpt-4.1-mini")
+        self.assertEqual(first, second)
+
+    def test_key_includes_model(self) -> None:
+        messages = [{"role": "user", "content": "what are your hours"}]
+        self.assertNotEqual(plan_cache_key(messages, "model-a"), plan_cache_key(messages, "model-b"))
+
+    def test_get_counts_hits_and_misses(self) -> None:
+        cache = PlanCache(max_entries=4, ttl_seconds=60)
+        self.assertIsNone(cache.get("k"))
+        cache.set("k", {"tool": "check_availability"})
+        self.assertEqual(cache.get("k"), {"tool": "check_availability"})
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_entries_expire_after_ttl(self) -> None:
+        clock = FakeClock()
+        cache = PlanCache(max_entries=4, ttl_seconds=10, clock=clock)
+        cache.set("k", {"tool": "create_ticket"})
+        clock.now = 10.0
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self) -> None:
+        cache = PlanCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", {"tool": "a"})
+        cache.set("b", {"tool": "b"})
+        cache.get("a")
+        cache.set("c", {"tool": "c"})
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_zero_capacity_disables_cache(self) -> None:
+        cache = PlanCache(max_entries=0, ttl_seconds=60)
+        cache.set("k", {"tool": "a"})
+        self.assertFalse(cache.enabled)
+        self.assertIsNone(cache.get("k"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,11 @@ APP_DIR = pathlib.Path(__file__).resolve().parents[1] / "app"
 sys.path.insert(0, str(APP_DIR))
 
 from planner_core import (  # noqa: E402
+    build_budgeted_messages,
     choose_tool,
+    choose_tools,
+    estimate_message_tokens,
+    estimate_tokens,
     fallback_assistant_reply,
     normalize_assistant_reply,
     normalize_tool_name,
@@ -21,6 +25,20 @@ class PlannerCoreTests(unittest.TestCase):
     def test_choose_tool_routes_issue_intents(self) -> None:
         self.assertEqual(choose_tool("I have a billing issue."), "create_ticket")
 
+    def test_choose_tool_keeps_rule_precedence(self) -> None:
+        self.assertEqual(choose_tool("Open a ticket to reschedule"), "book_appointment")
+        self.assertEqual(choose_tool("What are your opening hours? I hit a bug"), "check_availability")
+        self.assertEqual(choose_tool("Escalate this problem"), "create_ticket")
+        self.assertEqual(choose_tool("Let me talk to an AGENT"), "handoff_to_human")
+        self.assertEqual(choose_tool("hello there"), "check_availability")
+
+    def test_choose_tool_sees_overlapping_keywords(self) -> None:
+        self.assertEqual(choose_tool("hourschedule"), "book_appointment")
+
+    def test_choose_tools_classifies_in_input_order(self) -> None:
+        tools = choose_tools(["book me in", "found a bug", "get me a human"])
+        self.assertEqual(tools, ["book_appointment", "create_ticket", "handoff_to_human"])
+
     def test_normalize_tool_name_falls_back_for_invalid_tool(self) -> None:
         tool = normalize_tool_name("unknown_tool", "I need a human agent now")
         self.assertEqual(tool, "handoff_to_human")
@@ -33,6 +51,41 @@ class PlannerCoreTests(unittest.TestCase):
         value = truncate("abcdef", 4)
         self.assertEqual(value, "abc...")
 
+    def test_estimate_tokens_counts_words_and_punctuation(self) -> None:
+        self.assertEqual(estimate_tokens("Book me, please!"), 5)
+        self.assertEqual(estimate_tokens("availability"), 2)
+
+    def test_budgeted_messages_keep_newest_turns_and_latest_message(self) -> None:
+        turns = [("user", f"old question number {index} " + "filler " * 20) for index in range(6)]
+        messages, used = build_budgeted_messages("system", turns, "what are your hours", max_tokens=80)
+
+        self.assertEqual(messages[0], {"role": "system", "content": "system"})
+        self.assertEqual(messages[-1], {"role": "user", "content": "what are your hours"})
+        self.assertIn("old question number 5", messages[-2]["content"])
+        self.assertFalse(any("old question number 0" in message["content"] for message in messages[1:]))
+        self.assertEqual(used, sum(estimate_message_tokens(message) for message in messages))
+        self.assertLessEqual(used, 80)
+
+    def test_budgeted_messages_dedupe_repeated_assistant_replies(self) -> None:
+        boilerplate = fallback_assistant_reply("check_availability")
+        turns = [
+            ("user", "hi"),
+            ("assistant", boilerplate),
+            ("user", "hello?"),
+            ("assistant", boilerplate),
+            ("user", "book   me\n in"),
+        ]
+        messages, _ = build_budgeted_messages("system", turns, "book me in", max_tokens=1000)
+
+        self.assertEqual([message["content"] for message in messages].count(boilerplate), 1)
+        self.assertEqual(messages[-1], {"role": "user", "content": "book me in"})
+
+    def test_budgeted_messages_summarize_dropped_user_turns(self) -> None:
+        turns = [("user", "my order 123 never arrived " + "details " * 60), ("assistant", "Sorry to hear.")]
+        messages, _ = build_budgeted_messages("system", turns, "any update?", max_tokens=60)
+
+        self.assertTrue(messages[1]["content"].startswith("Earlier user messages (condensed): my order 123"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import pathlib
+import sys
+import unittest
+
+APP_DIR = pathlib.Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from single_flight import SingleFlight  # noqa: E402
+
+
+class SingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_upstream_call(self) -> None:
+        flights: SingleFlight[dict] = SingleFlight()
+        calls = 0
+
+        async def fetch() -> dict:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"tool": "check_availability"}
+
+        results = await asyncio.gather(*(flights.run("same", fetch) for _ in range(5)))
+
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(result == {"tool": "check_availability"} for result in results))
+        self.assertEqual(flights.stats(), {"in_flight": 0, "leaders": 1, "coalesced": 4})
+
+    async def test_sequential_calls_are_not_coalesced(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+
+        async def fetch() -> int:
+            return 1
+
+        await flights.run("same", fetch)
+        await flights.run("same", fetch)
+        self.assertEqual(flights.stats()["leaders"], 2)
+
+    async def test_cancelled_caller_does_not_cancel_followers(self) -> None:
+        flights: SingleFlight[str] = SingleFlight()
+
+        async def fetch() -> str:
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leader = asyncio.create_task(flights.run("same", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run("same", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import pathlib
+import sys
+import unittest
+
+APP_DIR = pathlib.Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from stream_parser import PlanStreamParser  # noqa: E402
+
+
+def feed_in_pieces(text: str, size: int) -> tuple[PlanStreamParser, list]:
+    parser = PlanStreamParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start : start + size]))
+    return parser, events
+
+
+class PlanStreamParserTests(unittest.TestCase):
+    def test_emits_tool_then_reply_deltas(self) -> None:
+        text = (
+            r'{"tool": "book_appointment", "tool_input": {"tool": "nested", "assistant_reply": "ignored"}, '
+            r'"assistant_reply": "Booked for \"Tuesday\"\nSee you \u00e9 \ud83d\ude00", "reasoning": "model"}'
+        )
+
+        parser, events = feed_in_pieces(text, 3)
+
+        self.assertEqual(events[0], ("tool", "book_appointment"))
+        reply = "".join(value for kind, value in events if kind == "reply_delta")
+        self.assertEqual(reply, json.loads(text)["assistant_reply"])
+        self.assertEqual(parser.text, text)
+
+    def test_reply_streams_before_object_is_complete(self) -> None:
+        parser = PlanStreamParser()
+        parser.feed('{"tool": "create_ticket", "assistant_reply": "I can')
+
+        self.assertEqual(parser.feed(' help"'), [("reply_delta", " help")])
+
+    def test_keys_inside_nested_values_are_ignored(self) -> None:
+        _, events = feed_in_pieces('{"tool_input": {"tool": "x"}, "tool": "handoff_to_human"}', 1)
+
+        self.assertEqual(events, [("tool", "handoff_to_human")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -174,6 +174,7 @@ class PythonServiceAssistantPlanner implements AssistantPlanner {
         headers: {
           'Content-Type': 'application/json',
           'X-Application-Name': this.config.appName,
+          'X-Deadline-Ms': String(this.config.timeoutMs),
         },
         body: JSON.stringify({
           latest_user_message: input.latestUserMessage,
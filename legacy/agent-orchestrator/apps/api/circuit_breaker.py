@@ -0,0 +1,316 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+CIRCUIT_BACKEND = os.getenv("CIRCUIT_BACKEND", "memory")  # memory, sqlite, redis
+CIRCUIT_SQLITE_PATH = os.getenv("CIRCUIT_SQLITE_PATH", "/tmp/mva_circuits.db")
+CIRCUIT_REDIS_URL = os.getenv("CIRCUIT_REDIS_URL", "redis://localhost:6379/0")
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "4"))
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_MS = float(os.getenv("CIRCUIT_SLOW_CALL_MS", "800"))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "10"))
+# Upper bound on outcomes kept per breaker, so shared records stay small.
+MAX_WINDOW_EVENTS = 200
+
+logger = logging.getLogger(__name__)
+
+BreakerRecord = Dict[str, Any]
+
+
+def _new_record() -> BreakerRecord:
+    # Plain JSON-able dict so every backend can store it as-is. Each event is [timestamp, failed, slow].
+    return {
+        "state": "closed",
+        "opened_at": 0.0,
+        "probe_started_at": None,
+        "events": [],
+        "times_opened": 0,
+    }
+
+
+class InMemoryBreakerBackend:
+    """Breaker records for this process only."""
+
+    def __init__(self):
+        self._records: Dict[str, BreakerRecord] = {}
+
+    # No awaits inside, so each call runs atomically on the event loop without a lock.
+    async def update(self, name: str, fn: Callable[[BreakerRecord], Any]) -> Any:
+        return fn(self._records.setdefault(name, _new_record()))
+
+    async def read(self, name: str) -> BreakerRecord:
+        return copy.deepcopy(self._records.get(name) or _new_record())
+
+    async def clear(self) -> None:
+        self._records.clear()
+
+
+class SQLiteBreakerBackend:
+    """Breaker records shared by every worker process on the host through one SQLite file.
+
+    Each update is a BEGIN IMMEDIATE read-modify-write, so concurrent workers see each other's outcomes;
+    an update that leaves the record as it was writes nothing. The busy wait and WAL fsync run in a
+    worker thread, never on the event loop.
+    """
+
+    def __init__(self, path: str, timeout_seconds: float = 1.0):
+        self._conn = sqlite3.connect(path, timeout=timeout_seconds, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS circuit_breakers (name TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        # Serializes worker threads sharing the one connection.
+        self._lock = threading.Lock()
+
+    def _load(self, name: str) -> BreakerRecord:
+        row = self._conn.execute("SELECT record FROM circuit_breakers WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else _new_record()
+
+    def _update_sync(self, name: str, fn: Callable[[BreakerRecord], Any]) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                record = self._load(name)
+                before = json.dumps(record)
+                result = fn(record)
+                after = json.dumps(record)
+                if after != before:
+                    self._conn.execute(
+                        "INSERT INTO circuit_breakers (name, record) VALUES (?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET record = excluded.record",
+                        (name, after),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def _read_sync(self, name: str) -> BreakerRecord:
+        with self._lock:
+            return self._load(name)
+
+    def _clear_sync(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM circuit_breakers")
+
+    async def update(self, name: str, fn: Callable[[BreakerRecord], Any]) -> Any:
+        return await asyncio.to_thread(self._update_sync, name, fn)
+
+    async def read(self, name: str) -> BreakerRecord:
+        return await asyncio.to_thread(self._read_sync, name)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear_sync)
+
+
+class RedisBreakerBackend:
+    """Breaker records shared across hosts; each update is an optimistic WATCH/MULTI transaction.
+
+    An update that leaves the record as it was only unwatches the key.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "mva:circuit:"):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as exc:
+            raise RuntimeError("CIRCUIT_BACKEND=redis requires the 'redis' package") from exc
+        self._redis = redis
+        self._client = redis.asyncio.Redis.from_url(url)
+        self._key_prefix = key_prefix
+
+    async def update(self, name: str, fn: Callable[[BreakerRecord], Any]) -> Any:
+        key = self._key_prefix + name
+        async with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    record = json.loads(raw) if raw else _new_record()
+                    before = json.dumps(record)
+                    result = fn(record)
+                    after = json.dumps(record)
+                    if after == before:
+                        await pipe.unwatch()
+                        return result
+                    pipe.multi()
+                    pipe.set(key, after)
+                    await pipe.execute()
+                    return result
+                except self._redis.WatchError:
+                    continue
+
+    async def read(self, name: str) -> BreakerRecord:
+        raw = await self._client.get(self._key_prefix + name)
+        return json.loads(raw) if raw else _new_record()
+
+    async def clear(self) -> None:
+        keys = [key async for key in self._client.scan_iter(self._key_prefix + "*")]
+        if keys:
+            await self._client.delete(*keys)
+
+
+def build_breaker_backend(kind: str = CIRCUIT_BACKEND):
+    if kind == "memory":
+        return InMemoryBreakerBackend()
+    if kind == "sqlite":
+        return SQLiteBreakerBackend(CIRCUIT_SQLITE_PATH)
+    if kind == "redis":
+        return RedisBreakerBackend(CIRCUIT_REDIS_URL)
+    raise ValueError(f"Unknown CIRCUIT_BACKEND: {kind}")
+
+
+class CircuitBreaker:
+    """Trips on failure rate or slow-call rate over a sliding time window, then lets one probe through.
+
+    All state lives in the backend record, so breakers in different worker processes that share a
+    backend act as one. If the backend is unreachable the breaker fails open rather than blocking tools.
+
+    Only state changes are persisted. While this process knows the circuit is open, requests are
+    rejected without a backend round trip, and rejections are counted in process memory, so an open
+    circuit under load does not turn into load on the backend.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        backend: Any,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        failure_rate_threshold: float = CIRCUIT_FAILURE_RATE,
+        slow_call_ms: float = CIRCUIT_SLOW_CALL_MS,
+        slow_call_rate_threshold: float = CIRCUIT_SLOW_CALL_RATE,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.name = name
+        self.backend = backend
+        self.window_seconds = window_seconds
+        self.min_calls = max(1, min_calls)
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_ms = slow_call_ms
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        # Wall clock, not monotonic: timestamps are compared across processes.
+        self._clock = clock
+        self.rejected = 0
+        # State seen on this process's last backend round trip (None until the first one).
+        self.last_state: Optional[str] = None
+        self._open_until = 0.0
+
+    async def _update(self, fn: Callable[[BreakerRecord, float], Any], default: Any) -> Any:
+        now = self._clock()
+        try:
+            return await self.backend.update(self.name, lambda record: fn(record, now))
+        except Exception:
+            logger.warning("Circuit backend unavailable for %s; failing open", self.name, exc_info=True)
+            return default
+
+    def _state(self, record: BreakerRecord, now: float) -> str:
+        if record["state"] == "open" and now - record["opened_at"] >= self.open_seconds:
+            record["state"] = "half_open"
+            record["probe_started_at"] = None
+        return record["state"]
+
+    def _remember(self, record: BreakerRecord) -> None:
+        self.last_state = record["state"]
+        # No other worker can move an open circuit on before open_seconds have passed.
+        self._open_until = record["opened_at"] + self.open_seconds if record["state"] == "open" else 0.0
+
+    async def allow_request(self, probe: bool = True) -> bool:
+        """probe=False (speculative calls) only admits through a closed circuit, never the half-open probe."""
+        if self._clock() < self._open_until:
+            allowed = False
+        else:
+            allowed = await self._update(lambda record, now: self._allow(record, now, probe), True)
+        if not allowed and probe:
+            self.rejected += 1
+        return allowed
+
+    def _allow(self, record: BreakerRecord, now: float, probe: bool = True) -> bool:
+        state = self._state(record, now)
+        allowed = state == "closed"
+        if state == "half_open" and probe:
+            probe_started_at = record["probe_started_at"]
+            # A probe that never reported back (e.g. cancelled) must not wedge the circuit.
+            if probe_started_at is None or now - probe_started_at >= self.open_seconds:
+                record["probe_started_at"] = now
+                allowed = True
+        self._remember(record)
+        return allowed
+
+    async def record_success(self, duration_ms: float = 0.0) -> None:
+        slow = duration_ms >= self.slow_call_ms
+        await self._update(lambda record, now: self._record(record, now, False, slow), None)
+
+    async def record_failure(self) -> None:
+        await self._update(lambda record, now: self._record(record, now, True, False), None)
+
+    def _record(self, record: BreakerRecord, now: float, failed: bool, slow: bool) -> None:
+        state = self._state(record, now)
+        if state == "half_open":
+            if failed or slow:
+                self._open(record, now)
+            else:
+                self._close(record)
+        elif state == "closed":
+            self._record_outcome(record, now, failed, slow)
+        # When open, the call was admitted before the trip and finished late; it says nothing new.
+        self._remember(record)
+
+    def _record_outcome(self, record: BreakerRecord, now: float, failed: bool, slow: bool) -> None:
+
+        events = [event for event in record["events"] if now - event[0] < self.window_seconds]
+        events.append([now, failed, slow])
+        record["events"] = events[-MAX_WINDOW_EVENTS:]
+        total = len(record["events"])
+        if total < self.min_calls:
+            return
+        failures = sum(1 for _, item_failed, _ in record["events"] if item_failed)
+        slow_calls = sum(1 for _, _, item_slow in record["events"] if item_slow)
+        if failures / total >= self.failure_rate_threshold or slow_calls / total >= self.slow_call_rate_threshold:
+            self._open(record, now)
+
+    def _open(self, record: BreakerRecord, now: float) -> None:
+        record["state"] = "open"
+        record["opened_at"] = now
+        record["probe_started_at"] = None
+        record["events"] = []
+        record["times_opened"] += 1
+
+    def _close(self, record: BreakerRecord) -> None:
+        record["state"] = "closed"
+        record["probe_started_at"] = None
+        record["events"] = []
+
+    async def snapshot(self) -> Dict[str, Any]:
+        now = self._clock()
+        try:
+            record = await self.backend.read(self.name)
+        except Exception:
+            return {"state": "unknown", "backend_error": True}
+        state = self._state(record, now)
+        self._remember(record)
+        events = [event for event in record["events"] if now - event[0] < self.window_seconds]
+        total = len(events)
+        failures = sum(1 for _, failed, _ in events if failed)
+        slow_calls = sum(1 for _, _, slow in events if slow)
+        retry_in_ms = 0
+        if state == "open":
+            retry_in_ms = max(0, int((record["opened_at"] + self.open_seconds - now) * 1000))
+        return {
+            "state": state,
+            "window_calls": total,
+            "failure_rate": round(failures / total, 3) if total else 0.0,
+            "slow_call_rate": round(slow_calls / total, 3) if total else 0.0,
+            "times_opened": record["times_opened"],
+            "rejected": self.rejected,
+            "retry_in_ms": retry_in_ms,
+        }
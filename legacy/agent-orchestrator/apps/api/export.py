@@ -0,0 +1,102 @@
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import Conversation, Message, ToolLog
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+
+def _conversation_filter(
+    since: Optional[datetime], until: Optional[datetime], status: Optional[str], created_by: datetime
+):
+    query = select(Conversation.id).where(Conversation.created_at <= created_by)
+    if since is not None:
+        query = query.where(Conversation.created_at >= since)
+    if until is not None:
+        query = query.where(Conversation.created_at < until)
+    if status is not None:
+        query = query.where(Conversation.status == status)
+    return query
+
+
+async def export_records(
+    db: AsyncSession,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield conversations, then their messages, then their tool logs, one typed record at a time.
+
+    Three server-side cursors read EXPORT_BATCH_SIZE rows at a time, so memory does not grow with the
+    size of the export. Rows are plain column mappings; no ORM objects enter the session.
+
+    All three sections describe the same moment. On Postgres they share one REPEATABLE READ, read-only
+    snapshot. Elsewhere, each section is cut off at the conversation creation time and the message
+    and tool log ids seen when the export started, so rows committed mid-export are left out.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True})
+    started_at = datetime.utcnow()
+    max_message_id = await db.scalar(select(func.coalesce(func.max(Message.id), 0)))
+    max_tool_log_id = await db.scalar(select(func.coalesce(func.max(ToolLog.id), 0)))
+
+    conversation_ids = _conversation_filter(since, until, status, started_at)
+    sections = (
+        (
+            "conversation",
+            select(Conversation.__table__).where(Conversation.id.in_(conversation_ids)).order_by(Conversation.id),
+        ),
+        (
+            "message",
+            select(Message.__table__)
+            .where(Message.conversation_id.in_(conversation_ids), Message.id <= max_message_id)
+            .order_by(Message.conversation_id, Message.order_index, Message.id),
+        ),
+        (
+            "tool_log",
+            select(ToolLog.__table__)
+            .where(ToolLog.conversation_id.in_(conversation_ids), ToolLog.id <= max_tool_log_id)
+            .order_by(ToolLog.conversation_id, ToolLog.created_at, ToolLog.id),
+        ),
+    )
+    for record_type, query in sections:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for row in result.mappings():
+            yield {"type": record_type, **row}
+
+
+def _json_default(value: Any) -> Any:
+    # Same timestamp format as the rest of the API (isoformat), not str()'s "YYYY-MM-DD HH:MM:SS".
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def ndjson_chunks(records: AsyncIterator[Dict[str, Any]], compress: bool = False) -> AsyncIterator[bytes]:
+    """Encode records as NDJSON, flushing every EXPORT_BATCH_SIZE lines; gzip the stream if asked."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    lines = []
+    async for record in records:
+        lines.append(json.dumps(record, default=_json_default))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            chunk = ("\n".join(lines) + "\n").encode()
+            lines = []
+            if compressor is None:
+                yield chunk
+            else:
+                compressed = compressor.compress(chunk)
+                if compressed:
+                    yield compressed
+
+    tail = ("\n".join(lines) + "\n").encode() if lines else b""
+    if compressor is None:
+        if tail:
+            yield tail
+    else:
+        yield compressor.compress(tail) + compressor.flush()
@@ -1,36 +1,61 @@
 import asyncio
 import logging
-import time
 import uuid
 from contextlib import asynccontextmanager
-from typing import Any, Dict, List, Optional
+from datetime import datetime
+from typing import Annotated, Any, Dict, List, Optional, Tuple
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import Base, Conversation as DBConversation
+from .database import Conversation as DBConversation
 from .database import Message as DBMessage
-from .database import ToolLog, engine, get_db
-from .orchestrator import run_agent_loop
+from .database import (
+    AsyncSessionLocal,
+    ToolLog,
+    async_engine,
+    ensure_schema,
+    get_async_db,
+    next_message_order,
+    pool_snapshot,
+)
+from .export import export_records, ndjson_chunks
+from .orchestrator import HISTORY_CACHE, build_turn_response, circuit_snapshots, run_agent_loop
+from .tool_log_writer import TOOL_LOG_WRITE_BEHIND, TOOL_LOG_WRITER
+from .turn_locks import IDEMPOTENCY_CACHE, TURN_LOCKS, TurnLockTimeout, find_turn_response
 
 logger = logging.getLogger(__name__)
 
+MAX_PAGE_SIZE = 1000
+PageLimit = Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)]
+# Keyset cursor: the id of the last row of the previous page.
+PageAfter = Annotated[Optional[int], Query(ge=1)]
+IdempotencyKey = Annotated[Optional[str], Header(alias="Idempotency-Key", max_length=255)]
+
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     attempts = 10
     for attempt in range(1, attempts + 1):
         try:
-            Base.metadata.create_all(bind=engine)
+            async with async_engine.begin() as conn:
+                await conn.run_sync(ensure_schema)
             break
         except Exception:
             if attempt == attempts:
                 raise
             logger.warning("Database not ready (attempt %s/%s), retrying...", attempt, attempts)
             await asyncio.sleep(1)
+    if TOOL_LOG_WRITE_BEHIND:
+        TOOL_LOG_WRITER.start()
     yield
+    # Drain queued tool logs while the engine is still open.
+    await TOOL_LOG_WRITER.stop()
+    await async_engine.dispose()
 
 
 app = FastAPI(title="Minimum Viable Agent Platform", lifespan=lifespan)
@@ -105,15 +130,8 @@ class HandoffResponse(BaseModel):
     reason: str
 
 
-def _next_message_order(db: Session, conversation_id: str) -> int:
-    current_max = db.query(func.max(DBMessage.order_index)).filter(
-        DBMessage.conversation_id == conversation_id
-    ).scalar()
-    return int(current_max or 0) + 1
-
-
 @app.post("/conversation", response_model=ConversationResponse)
-def create_conversation(conv: ConversationCreate, db: Session = Depends(get_db)):
+async def create_conversation(conv: ConversationCreate, db: AsyncSession = Depends(get_async_db)):
     new_id = str(uuid.uuid4())
     db_conv = DBConversation(
         id=new_id,
@@ -122,8 +140,7 @@ def create_conversation(conv: ConversationCreate, db: Session = Depends(get_db))
         slots={},
     )
     db.add(db_conv)
-    db.commit()
-    db.refresh(db_conv)
+    await db.commit()
     return ConversationResponse(
         id=db_conv.id,
         user_id=db_conv.user_id,
@@ -134,8 +151,8 @@ def create_conversation(conv: ConversationCreate, db: Session = Depends(get_db))
 
 
 @app.get("/conversation/{conversation_id}", response_model=ConversationResponse)
-def get_conversation(conversation_id: str, db: Session = Depends(get_db)):
-    conv = db.query(DBConversation).filter(DBConversation.id == conversation_id).first()
+async def get_conversation(conversation_id: str, db: AsyncSession = Depends(get_async_db)):
+    conv = await db.get(DBConversation, conversation_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return ConversationResponse(
@@ -148,42 +165,83 @@ def get_conversation(conversation_id: str, db: Session = Depends(get_db)):
 
 
 @app.post("/conversation/{conversation_id}/message", response_model=AgentTurnResponse)
-async def send_message(conversation_id: str, msg: MessageCreate, db: Session = Depends(get_db)):
-    db_conv = db.query(DBConversation).filter(DBConversation.id == conversation_id).first()
+async def send_message(
+    conversation_id: str,
+    msg: MessageCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: IdempotencyKey = None,
+):
+    # One turn per conversation at a time: a retry that arrives mid-turn waits, then replays the result.
+    try:
+        async with TURN_LOCKS.hold(conversation_id) as lock_conn:
+            if lock_conn is None:
+                return await _run_turn(conversation_id, msg, db, idempotency_key)
+            # The advisory lock lives on lock_conn; running the turn on it keeps a turn to one pooled connection.
+            async with AsyncSessionLocal(bind=lock_conn) as turn_db:
+                return await _run_turn(conversation_id, msg, turn_db, idempotency_key)
+    except TurnLockTimeout:
+        raise HTTPException(status_code=409, detail="Another turn is still running for this conversation")
+
+
+async def _run_turn(conversation_id: str, msg: MessageCreate, db: AsyncSession, idempotency_key: Optional[str]):
+    if idempotency_key is not None:
+        # Checked under the turn lock: a turn for this key on any worker has committed its row by now.
+        replay = await find_turn_response(db, conversation_id, idempotency_key)
+        if replay is not None:
+            return _replayed_response(replay, msg)
+
+    db_conv = await db.get(DBConversation, conversation_id)
     if not db_conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     if db_conv.status == "handoff":
-        return AgentTurnResponse(
-            response="A human operator is currently handling this conversation.",
-            tool_calls=[],
-            conversation_status="handoff",
-            latency_ms=0,
-            confidence=None,
-            slots=db_conv.slots or {},
-        )
-
-    turn_start = time.monotonic()
-    result = await run_agent_loop(conversation_id, msg.content, db)
-    result["latency_ms"] = int((time.monotonic() - turn_start) * 1000)
+        return build_turn_response("A human operator is currently handling this conversation.", db_conv, [], 0, None)
+
+    # latency_ms comes from the turn itself, so a replay from the idempotency_keys row matches the original.
+    try:
+        result = await run_agent_loop(conversation_id, msg.content, db, idempotency_key=idempotency_key)
+    except IntegrityError:
+        # Without advisory locks, a retry on another worker can overlap the original turn; whichever
+        # commits second is rolled back and answers with the first one's response.
+        if idempotency_key is None:
+            raise
+        await db.rollback()
+        replay = await find_turn_response(db, conversation_id, idempotency_key)
+        if replay is None:
+            raise
+        return _replayed_response(replay, msg)
+    if idempotency_key is not None:
+        IDEMPOTENCY_CACHE.set(conversation_id, idempotency_key, msg.content, result)
     return result
 
 
+def _replayed_response(replay: Tuple[str, Dict[str, Any]], msg: MessageCreate) -> Dict[str, Any]:
+    content, response = replay
+    if content != msg.content:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different message")
+    return response
+
+
 @app.post("/chat", response_model=AgentTurnResponse)
-async def chat(payload: ChatRequest, db: Session = Depends(get_db)):
+async def chat(
+    payload: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: IdempotencyKey = None,
+):
     return await send_message(
         conversation_id=payload.conversation_id,
         msg=MessageCreate(content=payload.message, role="user"),
         db=db,
+        idempotency_key=idempotency_key,
     )
 
 
 @app.post("/conversation/{conversation_id}/handoff", response_model=HandoffResponse)
-def emergency_handoff(
+async def emergency_handoff(
     conversation_id: str,
     request: HandoffRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    conversation = db.query(DBConversation).filter(DBConversation.id == conversation_id).first()
+    conversation = await db.get(DBConversation, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -192,15 +250,11 @@ def emergency_handoff(
         conversation_id=conversation_id,
         role="assistant",
         content="Emergency takeover enabled. A human operator has been notified.",
-        order_index=_next_message_order(db, conversation_id),
+        order_index=await next_message_order(db, conversation_id),
     )
-    db.add(assistant_message)
-    db.commit()
-    db.refresh(assistant_message)
-
     log = ToolLog(
         conversation_id=conversation_id,
-        message_id=assistant_message.id,
+        message=assistant_message,
         tool_name="handoff_to_human",
         input_params={"reason": request.reason},
         output={"status": "handoff_initiated", "reason": request.reason},
@@ -208,9 +262,10 @@ def emergency_handoff(
         status="success",
         error_msg=None,
     )
-    db.add(log)
-    db.commit()
-    db.refresh(conversation)
+    db.add_all([assistant_message, log])
+    await db.commit()
+    # Written outside run_agent_loop, so drop any cached history rather than patch it.
+    HISTORY_CACHE.invalidate(conversation_id)
 
     return HandoffResponse(
         conversation_id=conversation_id,
@@ -219,14 +274,34 @@ def emergency_handoff(
     )
 
 
+async def _cursor_row(db: AsyncSession, model: Any, conversation_id: str, after: int, *columns: Any) -> Any:
+    result = await db.execute(select(*columns).where(model.id == after, model.conversation_id == conversation_id))
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=400, detail="Unknown cursor")
+    return row
+
+
 @app.get("/conversation/{conversation_id}/history", response_model=List[MessageResponse])
-def get_history(conversation_id: str, db: Session = Depends(get_db)):
-    msgs = (
-        db.query(DBMessage)
-        .filter(DBMessage.conversation_id == conversation_id)
+async def get_history(
+    conversation_id: str,
+    limit: PageLimit = None,
+    after: PageAfter = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Pages walk idx_messages_conversation_order, so each one costs the same however long the conversation is.
+    query = (
+        select(DBMessage)
+        .where(DBMessage.conversation_id == conversation_id)
         .order_by(DBMessage.order_index, DBMessage.id)
-        .all()
     )
+    if after is not None:
+        cursor = await _cursor_row(db, DBMessage, conversation_id, after, DBMessage.order_index)
+        query = query.where(tuple_(DBMessage.order_index, DBMessage.id) > tuple_(cursor.order_index, after))
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    msgs = result.scalars().all()
     return [
         MessageResponse(
             id=msg.id,
@@ -240,13 +315,24 @@ def get_history(conversation_id: str, db: Session = Depends(get_db)):
 
 
 @app.get("/conversation/{conversation_id}/logs", response_model=List[ToolLogResponse])
-def get_logs(conversation_id: str, db: Session = Depends(get_db)):
-    logs = (
-        db.query(ToolLog)
-        .filter(ToolLog.conversation_id == conversation_id)
+async def get_logs(
+    conversation_id: str,
+    limit: PageLimit = None,
+    after: PageAfter = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    query = (
+        select(ToolLog)
+        .where(ToolLog.conversation_id == conversation_id)
         .order_by(ToolLog.created_at, ToolLog.id)
-        .all()
     )
+    if after is not None:
+        cursor = await _cursor_row(db, ToolLog, conversation_id, after, ToolLog.created_at)
+        query = query.where(tuple_(ToolLog.created_at, ToolLog.id) > tuple_(cursor.created_at, after))
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    logs = result.scalars().all()
     return [
         ToolLogResponse(
             id=log.id,
@@ -263,6 +349,43 @@ def get_logs(conversation_id: str, db: Session = Depends(get_db)):
     ]
 
 
+@app.get("/export")
+async def export_conversations(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    gzip: bool = False,
+):
+    async def stream():
+        # The session lives as long as the stream, not the request handler.
+        async with AsyncSessionLocal() as db:
+            async for chunk in ndjson_chunks(export_records(db, since, until, status), compress=gzip):
+                yield chunk
+
+    if gzip:
+        return StreamingResponse(
+            stream(),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="export.ndjson.gz"'},
+        )
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/stats/pool", tags=["Health"])
+def get_pool_stats():
+    return pool_snapshot()
+
+
+@app.get("/stats/tool-logs", tags=["Health"])
+def get_tool_log_writer_stats():
+    return TOOL_LOG_WRITER.snapshot()
+
+
+@app.get("/stats/circuits", tags=["Health"])
+async def get_circuit_stats():
+    return await circuit_snapshots()
+
+
 @app.get("/", tags=["Health"])
 def health_check():
     return {"status": "ok", "service": "MVA Platform"}
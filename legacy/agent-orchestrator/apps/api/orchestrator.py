@@ -1,20 +1,41 @@
 import asyncio
 import json
-import re
+import os
 import time
-from typing import Any, Dict, List, Optional
-
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-
-from .database import Conversation, Message, ToolLog
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .circuit_breaker import CircuitBreaker, build_breaker_backend
+from .database import Conversation, Message, ToolLog, next_message_order, supports_slot_patches
+from .text_analysis import analyze_message, merge_slots
+from .tool_log_writer import TOOL_LOG_WRITER, ToolLogWriter, tool_log_row
 from .tools import ToolRegistry
+from .turn_locks import record_turn_response
 
 GLOBAL_SLA_SECONDS = 5.0
 TOOL_TIMEOUT_SECONDS = 1.0
 LLM_TIMEOUT_SECONDS = 3.0
 LOW_CONFIDENCE_THRESHOLD = 0.45
 MAX_TURNS = 5
+HISTORY_CACHE_MAX_CONVERSATIONS = int(os.getenv("HISTORY_CACHE_MAX_CONVERSATIONS", "1024"))
+POLICY_EXECUTOR_WORKERS = int(os.getenv("POLICY_EXECUTOR_WORKERS", "4"))
+SPECULATIVE_AVAILABILITY_PREFETCH = os.getenv("SPECULATIVE_AVAILABILITY_PREFETCH", "false").lower() == "true"
+# Slot keys left out of the turn response (e.g. "available_slots"); GET /conversation/{id} still returns them.
+TURN_RESPONSE_OMIT_SLOTS = frozenset(
+    key.strip() for key in os.getenv("TURN_RESPONSE_OMIT_SLOTS", "").split(",") if key.strip()
+)
+
+# How run_agent_loop calls a policy's decide_next_step.
+POLICY_SYNC = "sync"  # microseconds of CPU: called inline on the event loop
+POLICY_ASYNC = "async"  # coroutine (e.g. a remote LLM): awaited under the SLA timeout
+POLICY_BLOCKING = "blocking"  # blocking IO or heavy CPU: runs on POLICY_EXECUTOR under the SLA timeout
 
 CALENDAR_TIMEOUT_FALLBACK = (
     "I'm having trouble checking the calendar right now, but I can take your contact info."
@@ -22,36 +43,79 @@ CALENDAR_TIMEOUT_FALLBACK = (
 TOOL_FAILURE_FALLBACK = "I'm having trouble completing that action right now. I can connect you to a human."
 GLOBAL_SLA_FALLBACK = "We are experiencing delays. Please try again later."
 
-
-class CircuitBreaker:
-    def __init__(self, failure_threshold: int = 2, cooldown_seconds: float = 10.0):
-        self.failure_threshold = failure_threshold
-        self.cooldown_seconds = cooldown_seconds
-        self.failure_count = 0
-        self.open_until = 0.0
-
-    def allow_request(self) -> bool:
-        return time.monotonic() >= self.open_until
-
-    def record_success(self) -> None:
-        self.failure_count = 0
-        self.open_until = 0.0
-
-    def record_failure(self) -> None:
-        self.failure_count += 1
-        if self.failure_count >= self.failure_threshold:
-            self.open_until = time.monotonic() + self.cooldown_seconds
+# ToolLog statuses whose output the turn can use; cache_hit marks a result served from the tool cache.
+SUCCESS_STATUSES = {"success", "cache_hit"}
 
 
+# Breaker state lives in the backend (CIRCUIT_BACKEND), so workers sharing it trip together.
+BREAKER_BACKEND = build_breaker_backend()
 TOOL_CIRCUITS: Dict[str, CircuitBreaker] = {}
 
 
 def _get_circuit(tool_name: str) -> CircuitBreaker:
     if tool_name not in TOOL_CIRCUITS:
-        TOOL_CIRCUITS[tool_name] = CircuitBreaker()
+        TOOL_CIRCUITS[tool_name] = CircuitBreaker(tool_name, BREAKER_BACKEND)
     return TOOL_CIRCUITS[tool_name]
 
 
+async def circuit_snapshots() -> Dict[str, Dict[str, Any]]:
+    tool_names = list(ToolRegistry.INPUT_MODELS)
+    snapshots = await asyncio.gather(*(_get_circuit(tool_name).snapshot() for tool_name in tool_names))
+    return dict(zip(tool_names, snapshots))
+
+
+class ConversationHistoryCache:
+    """Per-process LRU of conversation histories, kept current as this process appends messages.
+
+    Each entry remembers the last order_index it has seen. An append whose index is not the next one
+    means another writer touched the conversation, so the entry is dropped and reloaded on next use.
+    Readers pass the conversation's message_seq to get(), so writes by other workers that this
+    process never saw are caught before the stale history is used.
+    """
+
+    def __init__(self, max_conversations: int = 1024):
+        self.max_conversations = max_conversations
+        self._entries: "OrderedDict[str, Tuple[List[Dict[str, str]], int]]" = OrderedDict()
+
+    def get(self, conversation_id: str, message_seq: Optional[int] = None) -> Optional[List[Dict[str, str]]]:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return None
+        if message_seq is not None and entry[1] != message_seq:
+            self.invalidate(conversation_id)
+            return None
+        self._entries.move_to_end(conversation_id)
+        return entry[0]
+
+    def store(self, conversation_id: str, history: List[Dict[str, str]], last_order_index: int) -> None:
+        if self.max_conversations <= 0:
+            return
+        self._entries[conversation_id] = (history, last_order_index)
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+
+    def append(self, conversation_id: str, role: str, content: str, order_index: int) -> None:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return
+        history, last_order_index = entry
+        if order_index != last_order_index + 1:
+            self.invalidate(conversation_id)
+            return
+        history.append({"role": role, "content": content})
+        self._entries[conversation_id] = (history, order_index)
+
+    def invalidate(self, conversation_id: str) -> None:
+        self._entries.pop(conversation_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+HISTORY_CACHE = ConversationHistoryCache(HISTORY_CACHE_MAX_CONVERSATIONS)
+
+
 def _model_dump(data: Any) -> Dict[str, Any]:
     if data is None:
         return {}
@@ -71,56 +135,105 @@ def _latest_message_by_role(history: List[Dict[str, str]], role: str) -> str:
     return ""
 
 
-def _next_order_index(db: Session, conversation_id: str) -> int:
-    current_max = db.query(func.max(Message.order_index)).filter(
-        Message.conversation_id == conversation_id
-    ).scalar()
-    return int(current_max or 0) + 1
-
+class TurnUnitOfWork:
+    """Collects one turn's writes so they reach the database in a single transaction.
+
+    Nothing is written while the turn is deciding or awaiting tools, and run_agent_loop ends its read
+    transaction before then, so no transaction (or row lock on the conversation) is held across those
+    awaits. With a log writer, tool logs stay out of the
+    transaction and are handed to the writer after the commit. On Postgres, slot changes are sent as
+    a key patch with the order_index reservation rather than as a rewrite of the whole slots blob.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        log_writer: Optional[ToolLogWriter] = None,
+        idempotency_key: Optional[str] = None,
+    ):
+        self.db = db
+        self.conversation = conversation
+        self.log_writer = log_writer
+        self.idempotency_key = idempotency_key
+        self.messages: List[Message] = []
+        self.tool_logs: List[ToolLog] = []
+        self._tool_log_messages: List[Message] = []
+        self.patch_slots = supports_slot_patches(db)
+        self.slot_changes: Dict[str, Any] = {}
+
+    def add_message(self, role: str, content: str) -> Message:
+        message = Message(conversation_id=self.conversation.id, role=role, content=content)
+        self.messages.append(message)
+        return message
+
+    def update_slots(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        merged = {**_model_dump(self.conversation.slots), **changes}
+        if self.patch_slots:
+            # Keep the object readable without marking slots dirty; flush() writes only the changed keys.
+            self.slot_changes.update(changes)
+            set_committed_value(self.conversation, "slots", merged)
+        else:
+            self.conversation.slots = merged
+        return merged
 
-def _append_message(db: Session, conversation_id: str, role: str, content: str) -> Message:
-    message = Message(
-        conversation_id=conversation_id,
-        role=role,
-        content=content,
-        order_index=_next_order_index(db, conversation_id),
-    )
-    db.add(message)
-    db.commit()
-    db.refresh(message)
-    return message
+    def add_tool_log(self, log: ToolLog, message: Message) -> ToolLog:
+        if self.log_writer is None:
+            log.message = message
+        else:
+            # Linked by id after the flush: the relationship would cascade the log into the session.
+            log.created_at = datetime.utcnow()
+        self.tool_logs.append(log)
+        self._tool_log_messages.append(message)
+        return log
+
+    async def flush(self) -> None:
+        if self.messages or self.slot_changes:
+            first = await next_message_order(
+                self.db, self.conversation.id, len(self.messages), slots_patch=self.slot_changes
+            )
+            for offset, message in enumerate(self.messages):
+                message.order_index = first + offset
+        self.db.add_all(self.messages)
+        if self.log_writer is None:
+            self.db.add_all(self.tool_logs)
+        await self.db.flush()
+        if self.log_writer is not None:
+            for log, message in zip(self.tool_logs, self._tool_log_messages):
+                log.message_id = message.id
+
+    async def record_response(self, response: Dict[str, Any]) -> None:
+        """Store the response under the turn's Idempotency-Key, committed with the turn's own writes."""
+        if self.idempotency_key is not None:
+            user_content = next(message.content for message in self.messages if message.role == "user")
+            await record_turn_response(self.db, self.conversation.id, self.idempotency_key, user_content, response)
+
+    async def commit(self) -> None:
+        await self.db.commit()
+        for message in self.messages:
+            HISTORY_CACHE.append(self.conversation.id, message.role, message.content, message.order_index)
+        if self.log_writer is not None:
+            for log in self.tool_logs:
+                await self.log_writer.enqueue(tool_log_row(log))
+
+
+async def _load_history(db: AsyncSession, conversation: Conversation) -> List[Dict[str, str]]:
+    conversation_id = conversation.id
+    history = HISTORY_CACHE.get(conversation_id, conversation.message_seq)
+    if history is None:
+        result = await db.execute(
+            select(Message.role, Message.content, Message.order_index)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.order_index, Message.id)
+        )
+        rows = result.all()
+        history = [{"role": role, "content": content} for role, content, _ in rows]
+        HISTORY_CACHE.store(conversation_id, history, rows[-1].order_index if rows else 0)
+    return history
 
 
 def _extract_slots(message: str, existing_slots: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-    slots = dict(existing_slots or {})
-    lowered = message.lower()
-
-    email_match = re.search(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", message)
-    if email_match:
-        slots["email"] = email_match.group(0)
-
-    date_match = re.search(r"\b\d{4}-\d{2}-\d{2}\b", message)
-    if date_match:
-        slots["date"] = date_match.group(0)
-    elif "tomorrow" in lowered:
-        slots["date"] = "tomorrow"
-    elif "today" in lowered:
-        slots["date"] = "today"
-
-    time_match = re.search(r"\b\d{1,2}(:\d{2})?\s?(am|pm)?\b", lowered)
-    if time_match and ":" in time_match.group(0):
-        slots["time"] = time_match.group(0).replace(" ", "")
-
-    if any(word in lowered for word in ["book", "appointment", "schedule"]):
-        slots["intent"] = "booking"
-    elif any(word in lowered for word in ["availability", "check", "slot"]):
-        slots["intent"] = "availability"
-    elif any(word in lowered for word in ["issue", "ticket", "problem"]):
-        slots["intent"] = "ticket"
-    elif any(word in lowered for word in ["human", "operator", "agent"]):
-        slots["intent"] = "handoff"
-
-    return slots
+    return merge_slots(analyze_message(message), existing_slots)
 
 
 def _serialize_tool_log(log: ToolLog) -> Dict[str, Any]:
@@ -154,20 +267,41 @@ def _respond_with_tool_output(tool_name: str, output: Dict[str, Any]) -> str:
     return "Done."
 
 
-class AgentOrchestrator:
-    hostile_keywords = ["idiot", "stupid", "hate you", "useless", "kill"]
+# Dedicated so blocking policies cannot starve (or be starved by) the default executor.
+POLICY_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, POLICY_EXECUTOR_WORKERS), thread_name_prefix="policy")
+
+
+class DecisionPolicy(ABC):
+    """Chooses the next step of a turn. `kind` is one of POLICY_SYNC, POLICY_ASYNC, POLICY_BLOCKING.
 
-    def _confidence_score(self, content: str) -> float:
-        normalized = re.sub(r"\s+", " ", content.strip().lower())
-        if not normalized:
-            return 0.1
-        if re.fullmatch(r"[^a-z0-9]+", normalized):
-            return 0.1
-        if len(normalized) < 4:
-            return 0.25
-        if any(word in normalized for word in ["book", "appointment", "availability", "ticket", "human"]):
-            return 0.9
-        return 0.55
+    A subclass that does not implement decide_next_step cannot be instantiated.
+    """
+
+    kind = POLICY_SYNC
+
+    @abstractmethod
+    def decide_next_step(self, history: List[Dict[str, str]], slots: Optional[Dict[str, Any]] = None) -> Any:
+        """Return the step dict; a coroutine resolving to it for POLICY_ASYNC."""
+
+
+async def _decide(
+    policy: DecisionPolicy, history: List[Dict[str, str]], slots: Dict[str, Any], timeout: float
+) -> Dict[str, Any]:
+    if policy.kind == POLICY_SYNC:
+        return policy.decide_next_step(history, slots)
+    if policy.kind == POLICY_ASYNC:
+        return await asyncio.wait_for(policy.decide_next_step(history, slots), timeout=timeout)
+    if policy.kind == POLICY_BLOCKING:
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(POLICY_EXECUTOR, policy.decide_next_step, history, slots),
+            timeout=timeout,
+        )
+    raise ValueError(f"Unknown policy kind: {policy.kind}")
+
+
+class AgentOrchestrator(DecisionPolicy):
+    kind = POLICY_SYNC
 
     def decide_next_step(
         self, history: List[Dict[str, str]], slots: Optional[Dict[str, Any]] = None
@@ -177,10 +311,12 @@ class AgentOrchestrator:
 
         slots = slots or {}
         last_user_message = _latest_message_by_role(history, "user")
-        content = last_user_message.lower()
-        confidence = self._confidence_score(content)
+        # Same text run_agent_loop just analysed for slots, so this is normally an lru_cache hit.
+        analysis = analyze_message(last_user_message)
+        keywords = analysis.keywords
+        confidence = analysis.confidence
 
-        if any(keyword in content for keyword in self.hostile_keywords):
+        if analysis.hostile_hits:
             return {
                 "action": "tool",
                 "tool_name": "handoff_to_human",
@@ -188,7 +324,7 @@ class AgentOrchestrator:
                 "confidence": 0.2,
             }
 
-        if "human" in content or "operator" in content:
+        if "human" in keywords or "operator" in keywords:
             return {
                 "action": "tool",
                 "tool_name": "handoff_to_human",
@@ -204,7 +340,7 @@ class AgentOrchestrator:
                 "confidence": confidence,
             }
 
-        if "ticket" in content or "issue" in content or "problem" in content:
+        if "ticket" in keywords or "issue" in keywords or "problem" in keywords:
             return {
                 "action": "tool",
                 "tool_name": "create_ticket",
@@ -212,7 +348,7 @@ class AgentOrchestrator:
                 "confidence": confidence,
             }
 
-        if "availability" in content or ("check" in content and "calendar" in content) or "slots" in content:
+        if "availability" in keywords or ("check" in keywords and "calendar" in keywords) or "slots" in keywords:
             return {
                 "action": "tool",
                 "tool_name": "check_availability",
@@ -220,7 +356,7 @@ class AgentOrchestrator:
                 "confidence": confidence,
             }
 
-        if "book" in content or "appointment" in content or slots.get("intent") == "booking":
+        if "book" in keywords or "appointment" in keywords or slots.get("intent") == "booking":
             if not slots.get("date"):
                 return {
                     "action": "reply",
@@ -258,213 +394,256 @@ class AgentOrchestrator:
         }
 
 
-def _build_turn_response(
+def build_turn_response(
     response_text: str,
     conversation: Conversation,
     tool_calls: List[Dict[str, Any]],
     latency_ms: int,
     confidence: Optional[float],
 ) -> Dict[str, Any]:
+    """The turn response shape shared by every path that answers a message, slot filtering included."""
     return {
         "response": response_text,
         "tool_calls": tool_calls,
         "conversation_status": conversation.status,
         "latency_ms": latency_ms,
         "confidence": confidence,
-        "slots": conversation.slots or {},
+        "slots": {
+            key: value for key, value in (conversation.slots or {}).items() if key not in TURN_RESPONSE_OMIT_SLOTS
+        },
     }
 
 
-async def run_agent_loop(conversation_id: str, new_user_message: str, db: Session) -> Dict[str, Any]:
-    total_start = time.monotonic()
-    tool_calls_this_turn: List[Dict[str, Any]] = []
-    last_confidence: Optional[float] = None
+async def _finish_turn(
+    uow: TurnUnitOfWork,
+    response_text: str,
+    total_start: float,
+    confidence: Optional[float],
+) -> Dict[str, Any]:
+    uow.add_message("assistant", response_text)
+    # Flush first so tool logs carry their ids and timestamps (ids stay null when a log writer inserts
+    # them later), then build the response before the commit expires the session's objects.
+    await uow.flush()
+    response = build_turn_response(
+        response_text,
+        uow.conversation,
+        [_serialize_tool_log(log) for log in uow.tool_logs],
+        int((time.monotonic() - total_start) * 1000),
+        confidence,
+    )
+    await uow.record_response(response)
+    await uow.commit()
+    return response
 
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-    if not conversation:
-        raise ValueError("Conversation not found")
 
-    user_message = _append_message(db, conversation_id, "user", new_user_message)
-
-    updated_slots = _extract_slots(new_user_message, _model_dump(conversation.slots))
-    conversation.slots = updated_slots
-    db.commit()
-    db.refresh(conversation)
-
-    orchestrator = AgentOrchestrator()
-
-    for _ in range(MAX_TURNS):
-        elapsed = time.monotonic() - total_start
-        if elapsed > GLOBAL_SLA_SECONDS:
-            assistant = _append_message(db, conversation_id, "assistant", GLOBAL_SLA_FALLBACK)
-            return _build_turn_response(
-                assistant.content,
-                conversation,
-                tool_calls_this_turn,
-                int((time.monotonic() - total_start) * 1000),
-                last_confidence,
-            )
+def _step_tool_calls(step: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    if step["action"] == "tools":
+        return [(call["tool_name"], call.get("params", {})) for call in step["calls"]]
+    return [(step["tool_name"], step.get("params", {}))]
 
-        history_rows = (
-            db.query(Message)
-            .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.order_index, Message.id)
-            .all()
-        )
-        history = [{"role": row.role, "content": row.content} for row in history_rows]
 
-        llm_timeout = min(LLM_TIMEOUT_SECONDS, max(0.05, GLOBAL_SLA_SECONDS - elapsed))
+def _cached_tool_output(
+    tool_name: str, raw_params: Dict[str, Any]
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    if tool_name not in ToolRegistry.CACHE_TTL_SECONDS:
+        return None
+    try:
+        validated_params = ToolRegistry.validate_input(tool_name, raw_params)
+    except ValueError:
+        return None
+    output = ToolRegistry.cached_output(tool_name, validated_params)
+    return None if output is None else (validated_params, output)
+
+
+async def _run_tool(
+    tool_name: str, raw_params: Dict[str, Any], total_start: float, speculative: bool = False
+) -> Dict[str, Any]:
+    validated_params: Dict[str, Any] = raw_params
+    circuit = _get_circuit(tool_name)
+    tool_start = time.monotonic()
+    status = "success"
+    error_msg = None
+    output: Dict[str, Any] = {}
+
+    cached = _cached_tool_output(tool_name, raw_params)
+    if cached is not None:
+        # Served without touching the backend, so the breaker neither gates nor learns from it.
+        validated_params, output = cached
+        status = "cache_hit"
+    elif not await circuit.allow_request(probe=not speculative):
+        status = "circuit_open"
+        error_msg = "Circuit breaker is open"
+        output = {"error": error_msg}
+    else:
         try:
-            step = await asyncio.wait_for(
-                asyncio.to_thread(orchestrator.decide_next_step, history, conversation.slots or {}),
-                timeout=llm_timeout,
+            validated_params = ToolRegistry.validate_input(tool_name, raw_params)
+            remaining = max(0.05, GLOBAL_SLA_SECONDS - (time.monotonic() - total_start))
+            output = await asyncio.wait_for(
+                ToolRegistry.execute_tool(tool_name, **validated_params),
+                timeout=min(TOOL_TIMEOUT_SECONDS, remaining),
             )
+            await circuit.record_success((time.monotonic() - tool_start) * 1000)
+            ToolRegistry.record_output(tool_name, validated_params, output)
         except asyncio.TimeoutError:
-            assistant = _append_message(db, conversation_id, "assistant", GLOBAL_SLA_FALLBACK)
-            return _build_turn_response(
-                assistant.content,
-                conversation,
-                tool_calls_this_turn,
-                int((time.monotonic() - total_start) * 1000),
-                last_confidence,
-            )
-
-        last_confidence = step.get("confidence")
+            status = "timeout"
+            error_msg = "Tool execution timed out"
+            output = {"error": error_msg}
+            await circuit.record_failure()
+        except Exception as exc:
+            status = "error"
+            error_msg = str(exc)
+            output = {"error": error_msg}
+            await circuit.record_failure()
 
-        if step["action"] == "reply":
-            assistant = _append_message(db, conversation_id, "assistant", step["content"])
-            return _build_turn_response(
-                assistant.content,
-                conversation,
-                tool_calls_this_turn,
-                int((time.monotonic() - total_start) * 1000),
-                last_confidence,
-            )
+    return {
+        "tool_name": tool_name,
+        "params": validated_params,
+        "output": output,
+        "status": status,
+        "error_msg": error_msg,
+        "duration_ms": int((time.monotonic() - tool_start) * 1000),
+    }
 
-        if step["action"] != "tool":
-            assistant = _append_message(db, conversation_id, "assistant", "I could not determine the next step.")
-            return _build_turn_response(
-                assistant.content,
-                conversation,
-                tool_calls_this_turn,
-                int((time.monotonic() - total_start) * 1000),
-                last_confidence,
-            )
 
-        tool_name = step["tool_name"]
-        raw_params = step.get("params", {})
-        validated_params: Dict[str, Any] = raw_params
-        circuit = _get_circuit(tool_name)
-        tool_start = time.monotonic()
-        status = "success"
-        error_msg = None
-        output: Dict[str, Any] = {}
-
-        if not circuit.allow_request():
-            status = "circuit_open"
-            error_msg = "Circuit breaker is open"
-            output = {"error": error_msg}
-        else:
-            try:
-                validated_params = ToolRegistry.validate_input(tool_name, raw_params)
-                remaining = max(0.05, GLOBAL_SLA_SECONDS - (time.monotonic() - total_start))
-                output = await asyncio.wait_for(
-                    ToolRegistry.execute_tool(tool_name, **validated_params),
-                    timeout=min(TOOL_TIMEOUT_SECONDS, remaining),
-                )
-                circuit.record_success()
-            except asyncio.TimeoutError:
-                status = "timeout"
-                error_msg = "Tool execution timed out"
-                output = {"error": error_msg}
-                circuit.record_failure()
-            except Exception as exc:
-                status = "error"
-                error_msg = str(exc)
-                output = {"error": error_msg}
-                circuit.record_failure()
-
-        duration_ms = int((time.monotonic() - tool_start) * 1000)
-
-        log = ToolLog(
-            conversation_id=conversation_id,
-            message_id=user_message.id,
-            tool_name=tool_name,
-            input_params=validated_params,
-            output=output,
-            execution_time_ms=duration_ms,
-            status=status,
-            error_msg=error_msg,
+def _record_tool_results(
+    uow: TurnUnitOfWork, user_message: Message, results: List[Dict[str, Any]]
+) -> Tuple[List[str], bool]:
+    """Queue logs, tool messages and slot updates in call order; return reply fragments and handoff flag."""
+    conversation = uow.conversation
+    for result in results:
+        uow.add_tool_log(
+            ToolLog(
+                conversation_id=conversation.id,
+                tool_name=result["tool_name"],
+                input_params=result["params"],
+                output=result["output"],
+                execution_time_ms=result["duration_ms"],
+                status=result["status"],
+                error_msg=result["error_msg"],
+            ),
+            user_message,
         )
-        db.add(log)
-        db.commit()
-        db.refresh(log)
-        tool_calls_this_turn.append(_serialize_tool_log(log))
-
-        if status in {"timeout", "circuit_open"}:
-            fallback = CALENDAR_TIMEOUT_FALLBACK if tool_name == "check_availability" else TOOL_FAILURE_FALLBACK
-            assistant = _append_message(db, conversation_id, "assistant", fallback)
-            return _build_turn_response(
-                assistant.content,
-                conversation,
-                tool_calls_this_turn,
-                int((time.monotonic() - total_start) * 1000),
-                last_confidence,
-            )
-
-        if status == "error":
-            assistant = _append_message(db, conversation_id, "assistant", TOOL_FAILURE_FALLBACK)
-            return _build_turn_response(
-                assistant.content,
-                conversation,
-                tool_calls_this_turn,
-                int((time.monotonic() - total_start) * 1000),
-                last_confidence,
-            )
-
-        tool_message_content = json.dumps({"tool_name": tool_name, "result": output})
-        _append_message(db, conversation_id, "tool", tool_message_content)
 
+    replies: List[str] = []
+    handed_off = False
+    for result in results:
+        if result["status"] not in SUCCESS_STATUSES:
+            continue
+        tool_name, output = result["tool_name"], result["output"]
+        uow.add_message("tool", json.dumps({"tool_name": tool_name, "result": output}))
         if tool_name == "handoff_to_human":
             conversation.status = "handoff"
-            db.commit()
-            db.refresh(conversation)
-            assistant = _append_message(db, conversation_id, "assistant", "I am connecting you to an operator now.")
-            return _build_turn_response(
-                assistant.content,
-                conversation,
-                tool_calls_this_turn,
-                int((time.monotonic() - total_start) * 1000),
-                last_confidence,
-            )
-
+            handed_off = True
         if tool_name == "check_availability":
-            conversation.slots = {**_model_dump(conversation.slots), "available_slots": output.get("slots", [])}
-            db.commit()
-            db.refresh(conversation)
+            uow.update_slots({"available_slots": output.get("slots", [])})
         if tool_name == "book_appointment":
-            conversation.slots = {
-                **_model_dump(conversation.slots),
-                "confirmation_id": output.get("confirmation_id"),
-            }
-            db.commit()
-            db.refresh(conversation)
-
-        assistant_text = _respond_with_tool_output(tool_name, output)
-        assistant = _append_message(db, conversation_id, "assistant", assistant_text)
-        return _build_turn_response(
-            assistant.content,
-            conversation,
-            tool_calls_this_turn,
-            int((time.monotonic() - total_start) * 1000),
-            last_confidence,
-        )
+            uow.update_slots({"confirmation_id": output.get("confirmation_id")})
+        replies.append(_respond_with_tool_output(tool_name, output))
+    return replies, handed_off
 
-    assistant = _append_message(db, conversation_id, "assistant", GLOBAL_SLA_FALLBACK)
-    return _build_turn_response(
-        assistant.content,
-        conversation,
-        tool_calls_this_turn,
-        int((time.monotonic() - total_start) * 1000),
-        last_confidence,
-    )
+
+async def _claim_prefetch(prefetch: "asyncio.Task[Dict[str, Any]]", total_start: float) -> Dict[str, Any]:
+    result = await prefetch
+    if result["status"] == "circuit_open":
+        # The speculative call could not take a half-open probe; the real call may.
+        return await _run_tool(result["tool_name"], result["params"], total_start)
+    return result
+
+
+async def run_agent_loop(
+    conversation_id: str,
+    new_user_message: str,
+    db: AsyncSession,
+    policy: Optional[DecisionPolicy] = None,
+    idempotency_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    total_start = time.monotonic()
+    last_confidence: Optional[float] = None
+
+    conversation = await db.get(Conversation, conversation_id)
+    if not conversation:
+        raise ValueError("Conversation not found")
+    # The cached list is shared, so this turn's unsaved user message goes on a copy.
+    history = await _load_history(db, conversation) + [{"role": "user", "content": new_user_message}]
+    # End the read transaction so no connection sits idle in transaction while the policy and tools run.
+    # Nothing is dirty yet, and expire_on_commit=False keeps the loaded conversation readable.
+    if db.in_transaction():
+        await db.commit()
+
+    log_writer = TOOL_LOG_WRITER if TOOL_LOG_WRITER.running else None
+    uow = TurnUnitOfWork(db, conversation, log_writer, idempotency_key)
+    user_message = uow.add_message("user", new_user_message)
+    previous_date = (conversation.slots or {}).get("date")
+    message_slots = _extract_slots(new_user_message, None)
+    uow.update_slots(message_slots)
+
+    policy = policy or AgentOrchestrator()
+
+    # Booking usually needs the calendar next; start that lookup while the policy is still deciding.
+    prefetch: Optional["asyncio.Task[Dict[str, Any]]"] = None
+    prefetch_call: Optional[Tuple[str, Dict[str, Any]]] = None
+    prefetch_claimed = False
+    # Only for a booking message that brings a new date, so later turns of the same booking do not pay
+    # for a lookup that is thrown away. The breaker state is the one this process already knows (no
+    # backend read), and the prefetch is speculative: it never takes a half-open probe slot, which a
+    # cancelled prefetch would hold for another open_seconds.
+    message_date = message_slots.get("date")
+    if (
+        SPECULATIVE_AVAILABILITY_PREFETCH
+        and message_slots.get("intent") == "booking"
+        and message_date
+        and message_date != previous_date
+        and _get_circuit("check_availability").last_state in (None, "closed")
+    ):
+        prefetch_call = ("check_availability", {"date": message_date})
+        prefetch = asyncio.create_task(_run_tool(*prefetch_call, total_start, speculative=True))
+
+    try:
+        for _ in range(MAX_TURNS):
+            elapsed = time.monotonic() - total_start
+            if elapsed > GLOBAL_SLA_SECONDS:
+                return await _finish_turn(uow, GLOBAL_SLA_FALLBACK, total_start, last_confidence)
+
+            llm_timeout = min(LLM_TIMEOUT_SECONDS, max(0.05, GLOBAL_SLA_SECONDS - elapsed))
+            try:
+                step = await _decide(policy, history, conversation.slots or {}, llm_timeout)
+            except asyncio.TimeoutError:
+                return await _finish_turn(uow, GLOBAL_SLA_FALLBACK, total_start, last_confidence)
+
+            last_confidence = step.get("confidence")
+
+            if step["action"] == "reply":
+                return await _finish_turn(uow, step["content"], total_start, last_confidence)
+
+            if step["action"] not in {"tool", "tools"}:
+                return await _finish_turn(uow, "I could not determine the next step.", total_start, last_confidence)
+
+            calls = _step_tool_calls(step)
+            awaitables = []
+            for tool_name, raw_params in calls:
+                if prefetch is not None and not prefetch_claimed and (tool_name, raw_params) == prefetch_call:
+                    prefetch_claimed = True
+                    awaitables.append(_claim_prefetch(prefetch, total_start))
+                else:
+                    awaitables.append(_run_tool(tool_name, raw_params, total_start))
+            # gather keeps call order, so logs and tool messages are written in the order the policy listed them.
+            results = await asyncio.gather(*awaitables)
+
+            replies, handed_off = _record_tool_results(uow, user_message, results)
+            failed = next((result for result in results if result["status"] not in SUCCESS_STATUSES), None)
+            if failed is not None:
+                fallback = TOOL_FAILURE_FALLBACK
+                if failed["status"] in {"timeout", "circuit_open"} and failed["tool_name"] == "check_availability":
+                    fallback = CALENDAR_TIMEOUT_FALLBACK
+                # Calls that did succeed are committed, so say so; otherwise a retry would repeat them.
+                return await _finish_turn(uow, " ".join(replies + [fallback]), total_start, last_confidence)
+
+            if handed_off:
+                return await _finish_turn(uow, "I am connecting you to an operator now.", total_start, last_confidence)
+
+            return await _finish_turn(uow, " ".join(replies), total_start, last_confidence)
+
+        return await _finish_turn(uow, GLOBAL_SLA_FALLBACK, total_start, last_confidence)
+    finally:
+        if prefetch is not None and not prefetch_claimed:
+            prefetch.cancel()
@@ -3,7 +3,8 @@ CREATE TABLE conversations (
     user_id VARCHAR NULL,
     status VARCHAR DEFAULT 'active', -- active, handoff, closed
     slots JSONB DEFAULT '{}'::jsonb,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    message_seq INTEGER NOT NULL DEFAULT 0 -- last messages.order_index handed out
 );
 
 CREATE TABLE messages (
@@ -23,10 +24,19 @@ CREATE TABLE tool_logs (
     input_params JSONB DEFAULT '{}'::jsonb,
     output JSONB DEFAULT '{}'::jsonb,
     execution_time_ms INTEGER NOT NULL,
-    status VARCHAR NOT NULL, -- success, timeout, error, circuit_open
+    status VARCHAR NOT NULL, -- success, cache_hit, timeout, error, circuit_open
     error_msg TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX idx_messages_conversation_order ON messages (conversation_id, order_index);
+CREATE TABLE idempotency_keys (
+    conversation_id VARCHAR NOT NULL REFERENCES conversations(id),
+    key VARCHAR(255) NOT NULL,
+    content TEXT NOT NULL,
+    response JSON NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (conversation_id, key)
+);
+
+CREATE UNIQUE INDEX idx_messages_conversation_order ON messages (conversation_id, order_index);
 CREATE INDEX idx_tool_logs_conversation_created_at ON tool_logs (conversation_id, created_at);
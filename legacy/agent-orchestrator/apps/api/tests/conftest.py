@@ -1,3 +1,4 @@
+import asyncio
 import os
 from pathlib import Path
 
@@ -8,17 +9,11 @@ from fastapi.testclient import TestClient
 TEST_DB_PATH = Path("/tmp/mva_api_test.db")
 os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DB_PATH}"
 
-from api.database import Base, SessionLocal, engine, get_db  # noqa: E402
+from api.database import Base, engine  # noqa: E402
 from api.main import app  # noqa: E402
-from api.orchestrator import TOOL_CIRCUITS  # noqa: E402
-
-
-def _override_get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from api.orchestrator import BREAKER_BACKEND, HISTORY_CACHE, TOOL_CIRCUITS  # noqa: E402
+from api.tools import TOOL_CACHE  # noqa: E402
+from api.turn_locks import IDEMPOTENCY_CACHE  # noqa: E402
 
 
 @pytest.fixture(autouse=True)
@@ -26,12 +21,14 @@ def reset_database():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
     TOOL_CIRCUITS.clear()
+    asyncio.run(BREAKER_BACKEND.clear())
+    HISTORY_CACHE.clear()
+    TOOL_CACHE.clear()
+    IDEMPOTENCY_CACHE.clear()
     yield
 
 
 @pytest.fixture
 def client():
-    app.dependency_overrides[get_db] = _override_get_db
     with TestClient(app) as test_client:
         yield test_client
-    app.dependency_overrides.clear()
@@ -1,3 +1,11 @@
+import asyncio
+import gzip
+import json
+
+from api.database import AsyncSessionLocal
+from api.export import export_records
+
+
 def _create_conversation(client):
     res = client.post("/conversation", json={"user_id": "test-user"})
     assert res.status_code == 200
@@ -85,3 +93,111 @@ def test_booking_slot_collection_across_turns(client):
     assert payload["tool_calls"][0]["tool_name"] == "book_appointment"
     assert payload["tool_calls"][0]["status"] == "success"
     assert "confirmation" in payload["response"].lower()
+
+
+def test_pool_stats_report_checkouts(client):
+    _create_conversation(client)
+    res = client.get("/stats/pool")
+    assert res.status_code == 200
+    payload = res.json()
+    assert payload["acquired"] >= 1
+    assert payload["checked_out"] == 0
+    assert payload["acquire_timeouts"] == 0
+
+
+def test_history_and_logs_page_with_keyset_cursor(client):
+    conversation_id = _create_conversation(client)
+    for _ in range(3):
+        client.post(f"/conversation/{conversation_id}/message", json={"content": "check availability for 2026-02-12"})
+
+    full_history = client.get(f"/conversation/{conversation_id}/history").json()
+    pages, after = [], None
+    while True:
+        params = {"limit": 4} if after is None else {"limit": 4, "after": after}
+        page = client.get(f"/conversation/{conversation_id}/history", params=params).json()
+        if not page:
+            break
+        assert len(page) <= 4
+        pages.extend(page)
+        after = page[-1]["id"]
+    assert pages == full_history
+
+    logs = client.get(f"/conversation/{conversation_id}/logs").json()
+    second_page = client.get(f"/conversation/{conversation_id}/logs", params={"limit": 2, "after": logs[0]["id"]}).json()
+    assert second_page == logs[1:3]
+
+
+def test_history_rejects_cursor_from_another_conversation(client):
+    first_id = _create_conversation(client)
+    second_id = _create_conversation(client)
+    client.post(f"/conversation/{first_id}/message", json={"content": "hello there"})
+    foreign_id = client.get(f"/conversation/{first_id}/history").json()[0]["id"]
+
+    res = client.get(f"/conversation/{second_id}/history", params={"after": foreign_id})
+    assert res.status_code == 400
+    assert client.get(f"/conversation/{second_id}/logs", params={"limit": 0}).status_code == 422
+
+
+def _export_lines(content: bytes):
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+
+def test_export_streams_ndjson_grouped_by_record_type(client):
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "check availability for 2026-02-12"})
+    handed_off_id = _create_conversation(client)
+    client.post(f"/conversation/{handed_off_id}/handoff", json={"reason": "customer request"})
+
+    res = client.get("/export")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    records = _export_lines(res.content)
+    types = [record["type"] for record in records]
+    assert types == sorted(types, key=["conversation", "message", "tool_log"].index)
+    assert {record["id"] for record in records if record["type"] == "conversation"} == {conversation_id, handed_off_id}
+    messages = [record for record in records if record["type"] == "message" and record["conversation_id"] == conversation_id]
+    order = [record["order_index"] for record in messages]
+    assert len(order) >= 2 and order == sorted(order)
+    assert any(record["type"] == "tool_log" and record["tool_name"] == "check_availability" for record in records)
+
+    active_only = _export_lines(client.get("/export", params={"status": "active"}).content)
+    assert {record["conversation_id"] for record in active_only if record["type"] != "conversation"} == {conversation_id}
+    assert client.get("/export", params={"since": "2999-01-01T00:00:00"}).content == b""
+
+
+def test_export_sections_share_one_point_in_time(client):
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "check availability for 2026-02-12"})
+
+    async def export_with_a_write_in_between():
+        records = []
+        async with AsyncSessionLocal() as db:
+            async for record in export_records(db):
+                if not records:
+                    # Rows committed by another request after the export started.
+                    late_id = _create_conversation(client)
+                    late_message = {"content": "check availability for 2026-02-13"}
+                    client.post(f"/conversation/{late_id}/message", json=late_message)
+                    client.post(f"/conversation/{conversation_id}/message", json={"content": "hello there"})
+                records.append(record)
+        return records
+
+    records = asyncio.run(export_with_a_write_in_between())
+    assert {record["id"] for record in records if record["type"] == "conversation"} == {conversation_id}
+    assert {record["conversation_id"] for record in records if record["type"] != "conversation"} == {conversation_id}
+    assert "hello there" not in {record.get("content") for record in records}
+
+    exported = _export_lines(client.get("/export").content)
+    created_at = next(record["created_at"] for record in exported if record["id"] == conversation_id)
+    assert created_at == client.get(f"/conversation/{conversation_id}").json()["created_at"]
+
+
+def test_export_gzip_round_trip(client):
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "hello there"})
+
+    plain = client.get("/export").content
+    res = client.get("/export", params={"gzip": "true"})
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(res.content) == plain
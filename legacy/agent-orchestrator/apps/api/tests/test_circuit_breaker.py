@@ -0,0 +1,163 @@
+import asyncio
+import threading
+
+from api.circuit_breaker import CircuitBreaker, InMemoryBreakerBackend, SQLiteBreakerBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(backend, clock, **overrides):
+    options = dict(
+        window_seconds=30,
+        min_calls=4,
+        failure_rate_threshold=0.5,
+        slow_call_ms=500,
+        slow_call_rate_threshold=0.75,
+        open_seconds=10,
+        clock=clock,
+    )
+    options.update(overrides)
+    return CircuitBreaker("check_availability", backend, **options)
+
+
+def test_trips_on_failure_rate_and_recovers_through_half_open_probe():
+    clock = FakeClock()
+    breaker = _breaker(InMemoryBreakerBackend(), clock)
+
+    async def run():
+        await breaker.record_success(10)
+        await breaker.record_failure()
+        await breaker.record_success(10)
+        assert await breaker.allow_request()  # 3 calls: below min_calls
+        await breaker.record_failure()
+        assert (await breaker.snapshot())["state"] == "open"
+        assert not await breaker.allow_request()
+
+        clock.now += 10
+        assert await breaker.allow_request()  # the single half-open probe
+        assert not await breaker.allow_request()
+        await breaker.record_success(10)
+        snapshot = await breaker.snapshot()
+        assert snapshot["state"] == "closed"
+        assert snapshot["rejected"] == 2
+
+    asyncio.run(run())
+
+
+def test_old_outcomes_slide_out_of_the_window():
+    clock = FakeClock()
+    breaker = _breaker(InMemoryBreakerBackend(), clock)
+
+    async def run():
+        await breaker.record_failure()
+        await breaker.record_failure()
+        clock.now += 31
+        await breaker.record_failure()
+        for _ in range(3):
+            await breaker.record_success(10)
+        return await breaker.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["state"] == "closed"
+    assert snapshot["failure_rate"] == 0.25
+
+
+def test_trips_on_slow_call_rate():
+    breaker = _breaker(InMemoryBreakerBackend(), FakeClock())
+
+    async def run():
+        for _ in range(3):
+            await breaker.record_success(900)
+        await breaker.record_success(10)
+        return await breaker.snapshot()
+
+    assert asyncio.run(run())["state"] == "open"
+
+
+def test_sqlite_backend_shares_state_between_workers(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "circuits.db")
+    worker_a = _breaker(SQLiteBreakerBackend(path), clock)
+    worker_b = _breaker(SQLiteBreakerBackend(path), clock)
+
+    async def run():
+        await asyncio.gather(*(worker.record_failure() for worker in (worker_a, worker_b, worker_a, worker_b)))
+        assert not await worker_a.allow_request()
+        assert not await worker_b.allow_request()
+        # Rejections are counted per process.
+        assert (await worker_a.snapshot())["rejected"] == 1
+
+    asyncio.run(run())
+
+
+def test_open_circuit_rejects_without_backend_writes(tmp_path):
+    clock = FakeClock()
+    backend = SQLiteBreakerBackend(str(tmp_path / "circuits.db"))
+    calls = []
+    update = backend.update
+
+    async def counting_update(name, fn):
+        calls.append(name)
+        return await update(name, fn)
+
+    backend.update = counting_update
+    worker_a, worker_b = _breaker(backend, clock), _breaker(backend, clock)
+
+    async def run():
+        for _ in range(4):
+            await worker_a.record_failure()
+        calls.clear()
+        for _ in range(50):
+            assert not await worker_a.allow_request()
+        assert calls == []
+        assert worker_a.rejected == 50
+
+        clock.now += 10
+        assert await worker_a.allow_request()  # takes the half-open probe
+        writes = backend._conn.total_changes
+        # worker_b has never seen the trip, so it asks the backend once; the refusal writes nothing.
+        assert not await worker_b.allow_request()
+        assert backend._conn.total_changes == writes
+
+    asyncio.run(run())
+
+
+def test_sqlite_backend_does_its_io_off_the_event_loop(tmp_path):
+    backend = SQLiteBreakerBackend(str(tmp_path / "circuits.db"))
+    threads = []
+
+    def record_thread(record):
+        threads.append(threading.get_ident())
+
+    asyncio.run(backend.update("check_availability", record_thread))
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_backend_errors_fail_open():
+    class BrokenBackend:
+        async def update(self, name, fn):
+            raise ConnectionError("backend down")
+
+        async def read(self, name):
+            raise ConnectionError("backend down")
+
+    breaker = _breaker(BrokenBackend(), FakeClock())
+
+    async def run():
+        assert await breaker.allow_request()
+        await breaker.record_failure()
+        assert (await breaker.snapshot())["state"] == "unknown"
+
+    asyncio.run(run())
+
+
+def test_circuit_stats_endpoint_lists_every_tool(client):
+    payload = client.get("/stats/circuits").json()
+    assert set(payload) == {"check_availability", "book_appointment", "create_ticket", "handoff_to_human"}
+    assert payload["check_availability"]["state"] == "closed"
@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import exc, select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.schema import CreateTable
+
+from api.database import (
+    POOL_STATS,
+    Base,
+    Conversation,
+    InstrumentedAsyncQueuePool,
+    next_message_order,
+    patched_slots,
+    pool_options,
+    to_async_url,
+)
+
+
+# conftest points DATABASE_URL at SQLite; Postgres-only SQL runs against this server when it is set.
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def test_to_async_url_picks_asyncio_drivers():
+    assert to_async_url("postgresql://u:p@db:5432/mva") == "postgresql+asyncpg://u:p@db:5432/mva"
+    assert to_async_url("sqlite:////tmp/mva.db") == "sqlite+aiosqlite:////tmp/mva.db"
+    assert to_async_url("postgresql+asyncpg://u:p@db/mva") == "postgresql+asyncpg://u:p@db/mva"
+
+
+def test_pool_options_skip_in_memory_sqlite():
+    assert pool_options("sqlite://") == {}
+    assert pool_options("postgresql://u:p@db/mva")["poolclass"] is InstrumentedAsyncQueuePool
+
+
+def test_exhausted_pool_counts_acquire_timeouts(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    timeouts_before = POOL_STATS.acquire_timeouts
+
+    async def exhaust():
+        async with engine.connect() as held:
+            await held.execute(text("SELECT 1"))
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect() as waiting:
+                    await waiting.execute(text("SELECT 1"))
+        await engine.dispose()
+
+    asyncio.run(exhaust())
+    assert POOL_STATS.acquire_timeouts == timeouts_before + 1
+
+
+def test_slots_are_jsonb_and_patched_in_place_on_postgres():
+    dialect = postgresql.dialect()
+    assert "slots JSONB" in str(CreateTable(Conversation.__table__).compile(dialect=dialect))
+
+    statement = update(Conversation).values(slots=patched_slots({"available_slots": ["09:00"]}))
+    compiled = statement.compile(dialect=dialect)
+    assert "ELSE %(param_1)s::JSONB END || %(param_2)s::JSONB)" in str(compiled)
+    assert compiled.params["param_2"] == {"available_slots": ["09:00"]}
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="needs a Postgres server (set TEST_POSTGRES_URL)")
+def test_slot_patch_merges_keys_on_a_real_postgres():
+    async def run():
+        engine = create_async_engine(to_async_url(TEST_POSTGRES_URL))
+        try:
+            async with engine.connect() as conn:
+                # Everything, table creation included, is rolled back at the end.
+                transaction = await conn.begin()
+                try:
+                    await conn.run_sync(Base.metadata.create_all)
+                    async with AsyncSession(bind=conn) as db:
+                        db.add_all([
+                            Conversation(id="patched", slots={"intent": "booking", "date": "tomorrow"}),
+                            Conversation(id="no-slots", slots=None),
+                        ])
+                        await db.flush()
+                        patch = {"available_slots": ["09:00"]}
+                        first = await next_message_order(db, "patched", 2, slots_patch=patch)
+                        await next_message_order(db, "no-slots", slots_patch={"intent": "availability"})
+                        rows = await db.execute(select(Conversation.id, Conversation.slots))
+                        return first, dict(rows.all())
+                finally:
+                    await transaction.rollback()
+        finally:
+            await engine.dispose()
+
+    first, slots = asyncio.run(run())
+    assert first == 1
+    assert slots == {
+        "patched": {"intent": "booking", "date": "tomorrow", "available_slots": ["09:00"]},
+        "no-slots": {"intent": "availability"},
+    }
@@ -0,0 +1,575 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from api.database import (
+    AsyncSessionLocal,
+    Base,
+    Conversation,
+    Message,
+    SessionLocal,
+    async_engine,
+    engine,
+    ensure_schema,
+    next_message_order,
+)
+from api import orchestrator
+from api.circuit_breaker import CircuitBreaker
+from api.tools import ToolRegistry
+from api.tool_log_writer import ToolLogWriter
+from api.orchestrator import (
+    BREAKER_BACKEND,
+    GLOBAL_SLA_FALLBACK,
+    HISTORY_CACHE,
+    POLICY_ASYNC,
+    POLICY_BLOCKING,
+    TOOL_CIRCUITS,
+    TOOL_FAILURE_FALLBACK,
+    ConversationHistoryCache,
+    DecisionPolicy,
+    TurnUnitOfWork,
+    run_agent_loop,
+)
+
+
+def _create_conversation(client):
+    res = client.post("/conversation", json={"user_id": "test-user"})
+    assert res.status_code == 200
+    return res.json()["id"]
+
+
+def test_history_cache_tracks_messages_written_by_turns(client):
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "I need to book an appointment"})
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "2026-02-12"})
+
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    cached = HISTORY_CACHE.get(conversation_id)
+    assert cached == [{"role": item["role"], "content": item["content"]} for item in history]
+
+
+def test_manual_handoff_invalidates_cached_history(client):
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "I need to book an appointment"})
+    assert HISTORY_CACHE.get(conversation_id) is not None
+
+    client.post(f"/conversation/{conversation_id}/handoff", json={"reason": "operator override"})
+
+    assert HISTORY_CACHE.get(conversation_id) is None
+
+
+def test_message_order_comes_from_conversation_sequence(client):
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "I need to book an appointment"})
+    client.post(f"/conversation/{conversation_id}/handoff", json={"reason": "operator override"})
+
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    assert [item["order_index"] for item in history] == list(range(1, len(history) + 1))
+
+    db = SessionLocal()
+    try:
+        conversation = db.get(Conversation, conversation_id)
+        assert conversation.message_seq == len(history)
+    finally:
+        db.close()
+
+
+def test_history_cache_drops_entry_when_sequence_skips():
+    cache = ConversationHistoryCache()
+    cache.store("c1", [{"role": "user", "content": "hi"}], 1)
+
+    cache.append("c1", "assistant", "hello", 2)
+    assert cache.get("c1") == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+    # Index 3 was written by another process, so this entry no longer reflects the table.
+    cache.append("c1", "user", "again", 4)
+    assert cache.get("c1") is None
+
+
+def test_history_cache_reloads_after_another_worker_appends(client):
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "I need to book an appointment"})
+    assert HISTORY_CACHE.get(conversation_id) is not None
+
+    # Another worker appends a message; this process's cache never hears about it.
+    db = SessionLocal()
+    try:
+        conversation = db.get(Conversation, conversation_id)
+        conversation.message_seq += 1
+        db.add(Message(conversation_id=conversation_id, role="user", content="from worker 2",
+                       order_index=conversation.message_seq))
+        db.commit()
+    finally:
+        db.close()
+
+    seen = []
+
+    class RecordingPolicy(DecisionPolicy):
+        def decide_next_step(self, history, slots=None):
+            seen.extend(history)
+            return {"action": "reply", "content": "ok", "confidence": 1.0}
+
+    async def run_turn():
+        async with AsyncSessionLocal() as session:
+            await run_agent_loop(conversation_id, "anything else?", session, policy=RecordingPolicy())
+
+    asyncio.run(run_turn())
+    assert {"role": "user", "content": "from worker 2"} in seen
+
+
+def test_ensure_schema_backfills_sequence_on_existing_tables():
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE conversations (id VARCHAR PRIMARY KEY, user_id VARCHAR, status VARCHAR, "
+                          "slots JSON, created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id VARCHAR NOT NULL, "
+                          "role VARCHAR NOT NULL, content TEXT NOT NULL, order_index INTEGER NOT NULL, "
+                          "created_at DATETIME)"))
+        conn.execute(text("INSERT INTO conversations (id, status) VALUES ('c1', 'active')"))
+        conn.execute(text("INSERT INTO messages (conversation_id, role, content, order_index) "
+                          "VALUES ('c1', 'user', 'a', 1), ('c1', 'assistant', 'b', 2)"))
+        conn.execute(text("CREATE INDEX idx_messages_conversation_order ON messages (conversation_id, order_index)"))
+
+    with engine.begin() as conn:
+        ensure_schema(conn)
+
+    async def reserve():
+        async with AsyncSessionLocal() as db:
+            assert (await db.get(Conversation, "c1")).message_seq == 2
+            order_index = await next_message_order(db, "c1")
+            await db.commit()
+            return order_index
+
+    assert asyncio.run(reserve()) == 3
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("messages")}
+    assert indexes["idx_messages_conversation_order"]["unique"]
+
+
+def test_duplicate_message_order_is_rejected(client):
+    conversation_id = _create_conversation(client)
+    db = SessionLocal()
+    try:
+        db.add(Message(conversation_id=conversation_id, role="user", content="a", order_index=1))
+        db.commit()
+        db.add(Message(conversation_id=conversation_id, role="user", content="b", order_index=1))
+        with pytest.raises(IntegrityError):
+            db.commit()
+    finally:
+        db.rollback()
+        db.close()
+
+
+def _track_commits(db):
+    """Record, for each commit on the session, whether its transaction flushed any writes."""
+    commits, wrote = [], [False]
+
+    def after_commit(session):
+        commits.append(wrote[0])
+        wrote[0] = False
+
+    event.listen(db.sync_session, "after_flush", lambda session, context: wrote.__setitem__(0, True))
+    event.listen(db.sync_session, "after_commit", after_commit)
+    return commits
+
+
+def test_tool_turn_is_written_in_one_commit(client, monkeypatch):
+    conversation_id = _create_conversation(client)
+    connections_during_tool = []
+    execute_tool = ToolRegistry.execute_tool
+
+    async def run_turn():
+        async with AsyncSessionLocal() as db:
+            commits = _track_commits(db)
+
+            async def observing_execute_tool(tool_name, **params):
+                connections_during_tool.append(async_engine.pool.checkedout())
+                return await execute_tool(tool_name, **params)
+
+            monkeypatch.setattr(ToolRegistry, "execute_tool", observing_execute_tool)
+            return await run_agent_loop(conversation_id, "Please check calendar availability for tomorrow", db), commits
+
+    result, commits = asyncio.run(run_turn())
+
+    # The read transaction hands its connection back before the tool runs; all writes land in the last commit.
+    assert commits == [False, True]
+    assert connections_during_tool == [0]
+    logs = client.get(f"/conversation/{conversation_id}/logs").json()
+    assert [call["id"] for call in result["tool_calls"]] == [log["id"] for log in logs]
+    assert result["slots"]["available_slots"] == logs[0]["output"]["slots"]
+
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    assert [item["role"] for item in history] == ["user", "tool", "assistant"]
+    assert logs[0]["message_id"] == history[0]["id"]
+
+
+class _RecordingPolicy(DecisionPolicy):
+    def __init__(self, kind):
+        self.kind = kind
+        self.thread_names = []
+
+    def _reply(self):
+        self.thread_names.append(threading.current_thread().name)
+        return {"action": "reply", "content": f"{self.kind} reply", "confidence": 0.9}
+
+    def decide_next_step(self, history, slots=None):
+        if self.kind == POLICY_ASYNC:
+            return self._async_reply()
+        return self._reply()
+
+    async def _async_reply(self):
+        return self._reply()
+
+
+def _run_turn_with_policy(conversation_id, policy, message="hello there"):
+    async def run_turn():
+        async with AsyncSessionLocal() as db:
+            return await run_agent_loop(conversation_id, message, db, policy=policy), threading.current_thread()
+
+    return asyncio.run(run_turn())
+
+
+def test_policies_are_dispatched_by_kind(client):
+    conversation_id = _create_conversation(client)
+    for kind in ("sync", POLICY_ASYNC):
+        policy = _RecordingPolicy(kind)
+        result, loop_thread = _run_turn_with_policy(conversation_id, policy)
+        assert result["response"] == f"{kind} reply"
+        assert policy.thread_names == [loop_thread.name]
+
+    policy = _RecordingPolicy(POLICY_BLOCKING)
+    result, _ = _run_turn_with_policy(conversation_id, policy)
+    assert result["response"] == "blocking reply"
+    assert policy.thread_names[0].startswith("policy")
+
+
+def test_policy_without_decide_next_step_fails_when_built():
+    class IncompletePolicy(DecisionPolicy):
+        kind = POLICY_ASYNC
+
+    with pytest.raises(TypeError):
+        IncompletePolicy()
+
+
+def test_slow_blocking_policy_falls_back_within_budget(client, monkeypatch):
+    class SlowPolicy(DecisionPolicy):
+        kind = POLICY_BLOCKING
+
+        def decide_next_step(self, history, slots=None):
+            time.sleep(0.3)
+            return {"action": "reply", "content": "too late", "confidence": 0.9}
+
+    monkeypatch.setattr(orchestrator, "LLM_TIMEOUT_SECONDS", 0.05)
+    conversation_id = _create_conversation(client)
+    result, _ = _run_turn_with_policy(conversation_id, SlowPolicy())
+    assert result["response"] == GLOBAL_SLA_FALLBACK
+
+
+def test_multi_tool_step_runs_calls_together_in_listed_order(client):
+    class MultiToolPolicy(DecisionPolicy):
+        def decide_next_step(self, history, slots=None):
+            return {
+                "action": "tools",
+                "calls": [
+                    {"tool_name": "create_ticket", "params": {"issue_summary": "billing"}},
+                    {"tool_name": "check_availability", "params": {"date": "2026-02-12"}},
+                ],
+                "confidence": 0.9,
+            }
+
+    conversation_id = _create_conversation(client)
+    start = time.monotonic()
+    result, _ = _run_turn_with_policy(conversation_id, MultiToolPolicy())
+    elapsed = time.monotonic() - start
+
+    # create_ticket (0.3s) and check_availability (0.2s) overlap instead of adding up.
+    assert elapsed < 0.45
+    assert [call["tool_name"] for call in result["tool_calls"]] == ["create_ticket", "check_availability"]
+    assert result["response"].startswith("I created ticket TKT-998877")
+    assert result["slots"]["available_slots"]
+
+    logs = client.get(f"/conversation/{conversation_id}/logs").json()
+    assert [log["tool_name"] for log in logs] == ["create_ticket", "check_availability"]
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    assert [item["role"] for item in history] == ["user", "tool", "tool", "assistant"]
+
+
+def test_speculative_availability_prefetch_overlaps_policy(client, monkeypatch):
+    class SlowCalendarPolicy(DecisionPolicy):
+        kind = POLICY_ASYNC
+
+        async def decide_next_step(self, history, slots=None):
+            await asyncio.sleep(0.2)
+            return {
+                "action": "tool",
+                "tool_name": "check_availability",
+                "params": {"date": slots.get("date", "tomorrow")},
+                "confidence": 0.9,
+            }
+
+    monkeypatch.setattr(orchestrator, "SPECULATIVE_AVAILABILITY_PREFETCH", True)
+    conversation_id = _create_conversation(client)
+
+    async def run_turn():
+        async with AsyncSessionLocal() as db:
+            return await run_agent_loop(conversation_id, "book an appointment tomorrow", db, policy=SlowCalendarPolicy())
+
+    start = time.monotonic()
+    result = asyncio.run(run_turn())
+    elapsed = time.monotonic() - start
+
+    # The 0.2s calendar lookup ran while the 0.2s policy was deciding.
+    assert elapsed < 0.35
+    assert [call["tool_name"] for call in result["tool_calls"]] == ["check_availability"]
+    assert result["response"].startswith("I found availability for tomorrow")
+
+
+def test_repeated_availability_is_served_from_tool_cache(client):
+    first_id = _create_conversation(client)
+    second_id = _create_conversation(client)
+    first = client.post(f"/conversation/{first_id}/message", json={"content": "check availability for 2026-02-12"}).json()
+    second = client.post(f"/conversation/{second_id}/message", json={"content": "check availability for 2026-02-12"}).json()
+
+    assert first["tool_calls"][0]["status"] == "success"
+    assert second["tool_calls"][0]["status"] == "cache_hit"
+    assert second["tool_calls"][0]["output_json"] == first["tool_calls"][0]["output_json"]
+    assert second["response"] == first["response"]
+
+
+def test_booking_invalidates_cached_availability_for_its_date(client):
+    assert ToolRegistry.cached_output("check_availability", {"date": "2026-02-12"}) is None
+    conversation_id = _create_conversation(client)
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "check availability for 2026-02-12"})
+    assert ToolRegistry.cached_output("check_availability", {"date": "2026-02-12"}) is not None
+
+    client.post(
+        f"/conversation/{conversation_id}/message",
+        json={"content": "book 2026-02-12 then, 10:00 works, user@example.com"},
+    )
+    client.post(f"/conversation/{conversation_id}/message", json={"content": "10:00"})
+    logs = client.get(f"/conversation/{conversation_id}/logs").json()
+    assert logs[-1]["tool_name"] == "book_appointment" and logs[-1]["status"] == "success"
+    assert ToolRegistry.cached_output("check_availability", {"date": "2026-02-12"}) is None
+
+
+def test_side_effecting_tools_are_never_cached():
+    ToolRegistry.record_output("create_ticket", {"issue_summary": "billing"}, {"ticket_id": "TKT-1"})
+    assert ToolRegistry.cached_output("create_ticket", {"issue_summary": "billing"}) is None
+    assert "create_ticket" not in ToolRegistry.CACHE_TTL_SECONDS
+
+
+def test_write_behind_logs_are_inserted_after_the_turn_and_drained_on_stop(client, monkeypatch):
+    writer = ToolLogWriter(batch_size=10, flush_interval_seconds=5)
+    monkeypatch.setattr(orchestrator, "TOOL_LOG_WRITER", writer)
+    conversation_id = _create_conversation(client)
+
+    async def run_turns():
+        writer.start()
+        results = []
+        async with AsyncSessionLocal() as db:
+            commits = _track_commits(db)
+            for message in ("check availability for 2026-02-12", "check availability for 2026-02-13"):
+                results.append(await run_agent_loop(conversation_id, message, db))
+        written_before_stop = writer.written
+        await writer.stop()
+        return results, commits, written_before_stop
+
+    results, commits, written_before_stop = asyncio.run(run_turns())
+
+    assert commits == [False, True, False, True]
+    assert all(call["id"] is None and call["created_at"] for result in results for call in result["tool_calls"])
+    # The long flush interval held both rows in one batch until stop() drained it.
+    assert written_before_stop == 0
+    assert writer.written == 2 and writer.batches == 1
+    logs = client.get(f"/conversation/{conversation_id}/logs").json()
+    assert [log["input_params"]["date"] for log in logs] == ["2026-02-12", "2026-02-13"]
+    user_ids = [item["id"] for item in client.get(f"/conversation/{conversation_id}/history").json() if item["role"] == "user"]
+    assert [log["message_id"] for log in logs] == user_ids
+
+
+def test_write_behind_retries_failed_batches(client, monkeypatch):
+    writer = ToolLogWriter(flush_interval_seconds=0, retry_backoff_seconds=0)
+    conversation_id = _create_conversation(client)
+    insert = writer._insert
+    attempts = []
+
+    async def flaky_insert(batch):
+        attempts.append(len(batch))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        await insert(batch)
+
+    monkeypatch.setattr(writer, "_insert", flaky_insert)
+    monkeypatch.setattr(orchestrator, "TOOL_LOG_WRITER", writer)
+
+    async def run_turn():
+        writer.start()
+        async with AsyncSessionLocal() as db:
+            await run_agent_loop(conversation_id, "check availability for tomorrow", db)
+        await writer.stop()
+
+    asyncio.run(run_turn())
+
+    assert attempts == [1, 1]
+    assert writer.snapshot()["retries"] == 1 and writer.snapshot()["failed"] == 0
+    assert [log["tool_name"] for log in client.get(f"/conversation/{conversation_id}/logs").json()] == ["check_availability"]
+
+
+def test_slot_patches_leave_the_slots_column_clean(client):
+    conversation_id = _create_conversation(client)
+
+    async def update_slots():
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(Conversation, conversation_id)
+            uow = TurnUnitOfWork(db, conversation)
+            uow.patch_slots = True
+            uow.update_slots({"intent": "availability"})
+            uow.update_slots({"available_slots": ["09:00"]})
+            return uow.slot_changes, dict(conversation.slots), inspect(conversation).attrs.slots.history.has_changes()
+
+    changes, slots, dirty = asyncio.run(update_slots())
+    assert changes == {"intent": "availability", "available_slots": ["09:00"]}
+    assert slots == changes
+    assert not dirty
+
+
+def test_turn_response_can_omit_bulky_slots(client, monkeypatch):
+    monkeypatch.setattr(orchestrator, "TURN_RESPONSE_OMIT_SLOTS", frozenset({"available_slots"}))
+    conversation_id = _create_conversation(client)
+    turn = client.post(f"/conversation/{conversation_id}/message", json={"content": "check availability for tomorrow"}).json()
+
+    assert "available_slots" not in turn["slots"]
+    assert turn["slots"]["date"] == "tomorrow"
+    assert client.get(f"/conversation/{conversation_id}").json()["slots"]["available_slots"]
+
+    # A conversation held by an operator answers with the same response shape.
+    client.post(f"/conversation/{conversation_id}/handoff", json={"reason": "operator override"})
+    held = client.post(f"/conversation/{conversation_id}/message", json={"content": "hello?"}).json()
+    assert held["conversation_status"] == "handoff"
+    assert "available_slots" not in held["slots"]
+    assert held["slots"]["date"] == "tomorrow"
+
+
+def test_partial_multi_tool_failure_still_reports_the_calls_that_succeeded(client, monkeypatch):
+    class TicketAndCalendarPolicy(DecisionPolicy):
+        def decide_next_step(self, history, slots=None):
+            return {
+                "action": "tools",
+                "calls": [
+                    {"tool_name": "create_ticket", "params": {"issue_summary": "billing"}},
+                    {"tool_name": "check_availability", "params": {"date": "2026-02-12"}},
+                ],
+                "confidence": 0.9,
+            }
+
+    execute_tool = ToolRegistry.execute_tool
+
+    async def failing_calendar(tool_name, **params):
+        if tool_name == "check_availability":
+            raise RuntimeError("calendar down")
+        return await execute_tool(tool_name, **params)
+
+    monkeypatch.setattr(ToolRegistry, "execute_tool", failing_calendar)
+    conversation_id = _create_conversation(client)
+    result, _ = _run_turn_with_policy(conversation_id, TicketAndCalendarPolicy())
+
+    assert result["response"].startswith("I created ticket TKT-998877")
+    assert result["response"].endswith(TOOL_FAILURE_FALLBACK)
+
+
+def test_prefetch_leaves_a_half_open_probe_to_the_real_call(client, monkeypatch):
+    now = [1000.0]
+    circuit = CircuitBreaker("check_availability", BREAKER_BACKEND, min_calls=1, open_seconds=10, clock=lambda: now[0])
+    asyncio.run(circuit.record_failure())
+    now[0] += 10
+    monkeypatch.setitem(TOOL_CIRCUITS, "check_availability", circuit)
+    monkeypatch.setattr(orchestrator, "SPECULATIVE_AVAILABILITY_PREFETCH", True)
+
+    class ReplyPolicy(DecisionPolicy):
+        def decide_next_step(self, history, slots=None):
+            return {"action": "reply", "content": "What time suits you?", "confidence": 0.9}
+
+    conversation_id = _create_conversation(client)
+
+    async def run_turn():
+        async with AsyncSessionLocal() as db:
+            return await run_agent_loop(conversation_id, "book an appointment tomorrow", db, policy=ReplyPolicy())
+
+    assert asyncio.run(run_turn())["response"] == "What time suits you?"
+    assert asyncio.run(circuit.snapshot())["state"] == "half_open"
+    # The probe slot is still free for the next real call.
+    assert asyncio.run(circuit.allow_request())
+
+
+def _circuit_tripped_by_another_worker(monkeypatch):
+    now = [1000.0]
+    circuit = CircuitBreaker("check_availability", BREAKER_BACKEND, min_calls=1, open_seconds=10, clock=lambda: now[0])
+    other_worker = CircuitBreaker("check_availability", BREAKER_BACKEND, min_calls=1, open_seconds=10,
+                                  clock=lambda: now[0])
+    asyncio.run(circuit.snapshot())
+    assert circuit.last_state == "closed"
+    # Another worker trips the shared circuit; this process still believes it is closed.
+    asyncio.run(other_worker.record_failure())
+    now[0] += 10
+    monkeypatch.setitem(TOOL_CIRCUITS, "check_availability", circuit)
+    monkeypatch.setattr(orchestrator, "SPECULATIVE_AVAILABILITY_PREFETCH", True)
+    return circuit
+
+
+def test_cancelled_prefetch_with_stale_closed_state_leaves_the_probe_free(client, monkeypatch):
+    circuit = _circuit_tripped_by_another_worker(monkeypatch)
+
+    class ReplyPolicy(DecisionPolicy):
+        def decide_next_step(self, history, slots=None):
+            return {"action": "reply", "content": "What time suits you?", "confidence": 0.9}
+
+    conversation_id = _create_conversation(client)
+    _run_turn_with_policy(conversation_id, ReplyPolicy(), "book an appointment tomorrow")
+
+    assert asyncio.run(circuit.snapshot())["state"] == "half_open"
+    assert asyncio.run(circuit.allow_request())
+
+
+def test_prefetch_with_stale_closed_state_leaves_the_probe_to_the_real_call(client, monkeypatch):
+    circuit = _circuit_tripped_by_another_worker(monkeypatch)
+
+    class CalendarPolicy(DecisionPolicy):
+        def decide_next_step(self, history, slots=None):
+            return {"action": "tool", "tool_name": "check_availability", "params": {"date": "tomorrow"},
+                    "confidence": 0.9}
+
+    conversation_id = _create_conversation(client)
+    result, _ = _run_turn_with_policy(conversation_id, CalendarPolicy(), "book an appointment tomorrow")
+
+    assert [call["status"] for call in result["tool_calls"]] == ["success"]
+    assert asyncio.run(circuit.snapshot())["state"] == "closed"
+
+
+def test_prefetch_only_runs_when_a_booking_message_brings_a_new_date(client, monkeypatch):
+    executed = []
+    execute_tool = ToolRegistry.execute_tool
+
+    async def counting_execute_tool(tool_name, **params):
+        executed.append(params.get("date"))
+        return await execute_tool(tool_name, **params)
+
+    class ReplyPolicy(DecisionPolicy):
+        def decide_next_step(self, history, slots=None):
+            return {"action": "reply", "content": "What time suits you?", "confidence": 0.9}
+
+    monkeypatch.setattr(ToolRegistry, "execute_tool", counting_execute_tool)
+    monkeypatch.setattr(orchestrator, "SPECULATIVE_AVAILABILITY_PREFETCH", True)
+    conversation_id = _create_conversation(client)
+    for message in (
+        "book an appointment 2026-02-12",
+        "book it for 2026-02-12 please",  # same date
+        "I still want to book",  # booking, no date
+        "2026-02-13",  # new date, but not a booking message
+        "actually book 2026-02-14",
+    ):
+        _run_turn_with_policy(conversation_id, ReplyPolicy(), message)
+
+    assert executed == ["2026-02-12", "2026-02-14"]
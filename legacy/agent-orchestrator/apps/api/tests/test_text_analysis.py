@@ -0,0 +1,40 @@
+from api.text_analysis import analyze_message, merge_slots
+
+
+def test_booking_message_yields_slots_intent_and_confidence():
+    analysis = analyze_message("Book me in on 2026-02-12, 10:30 am, mail USER@example.com")
+    assert merge_slots(analysis, {"available_slots": ["09:00"]}) == {
+        "available_slots": ["09:00"],
+        "email": "USER@example.com",
+        "date": "2026-02-12",
+        "intent": "booking",
+    }
+    # The first time-like token is "20" from the date, which has no minutes, so no time slot.
+    assert analysis.time is None
+    assert analysis.confidence == 0.9
+    assert analysis.hostile_hits == ()
+
+
+def test_time_relative_date_and_hostility():
+    analysis = analyze_message("I HATE  YOU, fix it tomorrow at 10:30 pm")
+    assert analysis.time == "10:30pm"
+    assert analysis.date == "tomorrow"
+    assert analysis.hostile_hits == ()  # "hate  you" has two spaces, as with the old substring check
+
+    assert analyze_message("you are useless").hostile_hits == ("useless",)
+
+
+def test_confidence_levels():
+    assert analyze_message("   ").confidence == 0.1
+    assert analyze_message("?? !!").confidence == 0.1
+    assert analyze_message("a  b").confidence == 0.25
+    assert analyze_message("hello there").confidence == 0.55
+    assert analyze_message("need a human").confidence == 0.9
+
+
+def test_intent_precedence_follows_keyword_groups():
+    assert analyze_message("check if I can book").intent == "booking"
+    assert analyze_message("any slots free?").intent == "availability"
+    assert analyze_message("agent please, this ticket is stuck").intent == "ticket"
+    assert analyze_message("get me an agent").intent == "handoff"
+    assert analyze_message("hello").intent is None
@@ -0,0 +1,360 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, update
+
+from api import main
+from api.database import AsyncSessionLocal, Conversation, IdempotencyRecord, async_engine
+from api.main import MessageCreate, send_message
+from api.orchestrator import build_turn_response
+from api.tools import ToolRegistry
+from api.turn_locks import (
+    IDEMPOTENCY_CACHE,
+    ConversationTurnLocks,
+    IdempotencyCache,
+    TurnLockTimeout,
+    advisory_lock_key,
+)
+
+
+def _create_conversation(client):
+    res = client.post("/conversation", json={"user_id": "test-user"})
+    assert res.status_code == 200
+    return res.json()["id"]
+
+
+def _send_concurrently(turns, idempotency_key=None):
+    async def send(conversation_id, content):
+        async with AsyncSessionLocal() as db:
+            return await send_message(conversation_id, MessageCreate(content=content), db, idempotency_key)
+
+    async def run():
+        return await asyncio.gather(*(send(conversation_id, content) for conversation_id, content in turns))
+
+    return asyncio.run(run())
+
+
+def test_concurrent_turns_on_one_conversation_run_one_at_a_time(client, monkeypatch):
+    in_flight, peak = [0], [0]
+    execute_tool = ToolRegistry.execute_tool
+
+    async def tracking_execute_tool(tool_name, **params):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        try:
+            return await execute_tool(tool_name, **params)
+        finally:
+            in_flight[0] -= 1
+
+    monkeypatch.setattr(ToolRegistry, "execute_tool", tracking_execute_tool)
+    conversation_id = _create_conversation(client)
+    other_id = _create_conversation(client)
+    _send_concurrently(
+        [(conversation_id, "check availability for 2026-02-12"), (conversation_id, "check availability for 2026-02-13")]
+    )
+    assert peak[0] == 1
+
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    assert [item["role"] for item in history] == ["user", "tool", "assistant"] * 2
+    assert history[3]["content"] == "check availability for 2026-02-13"
+
+    # Different conversations still run side by side.
+    peak[0] = 0
+    _send_concurrently(
+        [(conversation_id, "check availability for 2026-02-14"), (other_id, "check availability for 2026-02-15")]
+    )
+    assert peak[0] == 2
+
+
+def test_retry_with_same_idempotency_key_replays_the_original_turn(client, monkeypatch):
+    executed = []
+    execute_tool = ToolRegistry.execute_tool
+
+    async def counting_execute_tool(tool_name, **params):
+        executed.append(tool_name)
+        return await execute_tool(tool_name, **params)
+
+    monkeypatch.setattr(ToolRegistry, "execute_tool", counting_execute_tool)
+    conversation_id = _create_conversation(client)
+    message = "I have an issue with my billing account."
+
+    # The retry arrives while the first request is still running.
+    first, retried = _send_concurrently([(conversation_id, message)] * 2, idempotency_key="retry-1")
+    assert first == retried
+    assert executed == ["create_ticket"]
+
+    headers = {"Idempotency-Key": "retry-1"}
+    late_retry = client.post(f"/conversation/{conversation_id}/message", json={"content": message}, headers=headers)
+    assert late_retry.json() == first
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    assert [item["role"] for item in history] == ["user", "tool", "assistant"]
+
+    reused = client.post(f"/conversation/{conversation_id}/message", json={"content": "other"}, headers=headers)
+    assert reused.status_code == 422
+
+
+def test_retry_on_another_worker_replays_the_committed_turn(client, monkeypatch):
+    executed = []
+    execute_tool = ToolRegistry.execute_tool
+
+    async def counting_execute_tool(tool_name, **params):
+        executed.append(tool_name)
+        return await execute_tool(tool_name, **params)
+
+    monkeypatch.setattr(ToolRegistry, "execute_tool", counting_execute_tool)
+    conversation_id = _create_conversation(client)
+    message = "I have an issue with my billing account."
+    url = f"/conversation/{conversation_id}/message"
+    headers = {"Idempotency-Key": "retry-2"}
+
+    first = client.post(url, json={"content": message}, headers=headers).json()
+    # Another worker has nothing in its process cache; the row committed with the turn answers instead.
+    IDEMPOTENCY_CACHE.clear()
+    retried = client.post(url, json={"content": message}, headers=headers)
+    assert retried.json() == first
+    assert executed == ["create_ticket"]
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    assert [item["role"] for item in history] == ["user", "tool", "assistant"]
+
+    IDEMPOTENCY_CACHE.clear()
+    assert client.post(url, json={"content": "other"}, headers=headers).status_code == 422
+
+
+def test_retry_that_overlaps_the_original_on_another_worker_answers_with_its_response(client, monkeypatch):
+    conversation_id = _create_conversation(client)
+    original = build_turn_response("Ticket created.", Conversation(status="active", slots={}), [], 7, None)
+    execute_tool = ToolRegistry.execute_tool
+
+    async def original_commits_first(tool_name, **params):
+        # The original turn, on a worker that did not share this one's lock, commits while this turn runs.
+        async with AsyncSessionLocal() as db:
+            record = IdempotencyRecord(conversation_id=conversation_id, key="retry-4", content=message, response=original)
+            db.add(record)
+            await db.commit()
+        return await execute_tool(tool_name, **params)
+
+    monkeypatch.setattr(ToolRegistry, "execute_tool", original_commits_first)
+    message = "I have an issue with my billing account."
+    headers = {"Idempotency-Key": "retry-4"}
+    res = client.post(f"/conversation/{conversation_id}/message", json={"content": message}, headers=headers)
+    assert res.json() == original
+    # This turn's own writes were rolled back.
+    assert client.get(f"/conversation/{conversation_id}/history").json() == []
+
+
+def test_expired_idempotency_keys_are_not_replayed(client, monkeypatch):
+    conversation_id = _create_conversation(client)
+    url = f"/conversation/{conversation_id}/message"
+    headers = {"Idempotency-Key": "retry-3"}
+    assert client.post(url, json={"content": "hello"}, headers=headers).status_code == 200
+
+    async def age_keys():
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(IdempotencyRecord).values(created_at=datetime.utcnow() - timedelta(days=1)))
+            await db.commit()
+
+    asyncio.run(age_keys())
+    IDEMPOTENCY_CACHE.clear()
+    # Past the TTL the key is free again: the turn runs, and the stale row is replaced in its transaction.
+    assert client.post(url, json={"content": "hello again"}, headers=headers).status_code == 200
+    history = client.get(f"/conversation/{conversation_id}/history").json()
+    assert [item["content"] for item in history if item["role"] == "user"] == ["hello", "hello again"]
+
+
+def test_turn_lock_times_out_and_is_dropped_when_idle():
+    locks = ConversationTurnLocks(timeout_seconds=0.05)
+
+    async def run():
+        async with locks.hold("conv-1"):
+            with pytest.raises(TurnLockTimeout):
+                async with locks.hold("conv-1"):
+                    pass
+            # Other conversations are not blocked.
+            async with locks.hold("conv-2"):
+                pass
+
+    asyncio.run(run())
+    assert locks._locks == {}
+
+
+def test_idempotency_cache_expires_entries():
+    now = [0.0]
+    cache = IdempotencyCache(max_entries=1, ttl_seconds=10, clock=lambda: now[0])
+    cache.set("conv-1", "key", "hello", {"response": "hi"})
+    assert cache.get("conv-1", "key") == ("hello", {"response": "hi"})
+    assert cache.get("conv-2", "key") is None
+
+    now[0] = 10.0
+    assert cache.get("conv-1", "key") is None
+
+
+def test_advisory_lock_key_is_stable_signed_bigint():
+    key = advisory_lock_key("00000000-0000-0000-0000-000000000000")
+    assert key == advisory_lock_key("00000000-0000-0000-0000-000000000000")
+    assert -(2**63) <= key < 2**63
+
+
+class FakeAdvisoryServer:
+    """Session-level advisory locks as Postgres keeps them: owned by a connection until unlocked or closed."""
+
+    def __init__(self):
+        self.owners = {}
+        self.connections = []
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.invalidated = False
+        self.block_lock_query = None
+        self.fail_unlock = False
+        server.connections.append(self)
+
+    async def execute(self, statement):
+        sql = str(statement)
+        (key,) = statement.compile().params.values()
+        if "pg_try_advisory_lock" in sql:
+            if self.block_lock_query is not None:
+                await self.block_lock_query.wait()
+            owner = self.server.owners.setdefault(key, self)
+            result = owner is self
+        else:
+            if self.fail_unlock:
+                raise ConnectionError("connection lost")
+            result = self.server.owners.get(key) is self
+            if result:
+                del self.server.owners[key]
+        return type("Result", (), {"scalar": lambda _: result})()
+
+    def in_transaction(self):
+        return False
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def invalidate(self):
+        self.invalidated = True
+        self.server.owners = {key: owner for key, owner in self.server.owners.items() if owner is not self}
+
+
+class FakePostgresEngine:
+    dialect = type("Dialect", (), {"name": "postgresql"})()
+
+    def __init__(self, server):
+        self.server = server
+
+    @asynccontextmanager
+    async def connect(self):
+        yield FakeConnection(self.server)
+
+
+def _advisory_locks(server, timeout_seconds=1.0):
+    return ConversationTurnLocks(
+        FakePostgresEngine(server), advisory=True, timeout_seconds=timeout_seconds, poll_seconds=0.01
+    )
+
+
+def test_advisory_lock_waits_for_other_workers_without_cancelling_queries():
+    server = FakeAdvisoryServer()
+    worker_a, worker_b = _advisory_locks(server), _advisory_locks(server, timeout_seconds=0.05)
+    key = advisory_lock_key("conv-1")
+
+    async def run():
+        async with worker_a.hold("conv-1") as conn:
+            assert server.owners == {key: conn}
+            with pytest.raises(TurnLockTimeout):
+                async with worker_b.hold("conv-1"):
+                    pass
+        assert server.owners == {}
+        async with worker_b.hold("conv-1") as conn:
+            assert server.owners == {key: conn}
+
+    asyncio.run(run())
+    assert server.owners == {}
+    # Timing out between polls leaves a clean connection that can go back to the pool.
+    assert not any(conn.invalidated for conn in server.connections)
+
+
+def test_advisory_lock_connection_is_invalidated_when_acquire_is_cancelled():
+    server = FakeAdvisoryServer()
+    locks = _advisory_locks(server)
+    stalled = asyncio.Event()
+
+    async def connect_stalled():
+        conn = FakeConnection(server)
+        conn.block_lock_query = stalled
+        yield conn
+
+    locks.engine.connect = asynccontextmanager(connect_stalled)
+
+    async def run():
+        async def turn():
+            async with locks.hold("conv-1"):
+                pass
+
+        task = asyncio.create_task(turn())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert [conn.invalidated for conn in server.connections] == [True]
+    assert locks._locks == {}
+
+
+def test_advisory_lock_connection_is_invalidated_when_unlock_fails():
+    server = FakeAdvisoryServer()
+    locks = _advisory_locks(server)
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            async with locks.hold("conv-1") as conn:
+                conn.fail_unlock = True
+
+    asyncio.run(run())
+    assert server.connections[0].invalidated
+    # Closing the Postgres session released the lock, so the next turn gets it.
+    assert server.owners == {}
+
+
+def test_advisory_locked_turn_runs_on_the_lock_connection(client, monkeypatch):
+    class SQLiteAdvisoryLocks(ConversationTurnLocks):
+        # SQLite has no advisory locks; only the connection handling is under test here.
+        async def _try_advisory_lock(self, conn, key, deadline):
+            return True
+
+        async def _advisory_unlock(self, conn, key):
+            pass
+
+    locks = SQLiteAdvisoryLocks(async_engine)
+    locks.advisory = True
+    monkeypatch.setattr(main, "TURN_LOCKS", locks)
+    conversation_id = _create_conversation(client)
+
+    checkouts = []
+    checked_out_during_tool = []
+    execute_tool = ToolRegistry.execute_tool
+
+    async def tracking_execute_tool(tool_name, **params):
+        checked_out_during_tool.append(async_engine.pool.checkedout())
+        return await execute_tool(tool_name, **params)
+
+    def on_checkout(*args):
+        checkouts.append(args)
+
+    monkeypatch.setattr(ToolRegistry, "execute_tool", tracking_execute_tool)
+    event.listen(async_engine.sync_engine, "checkout", on_checkout)
+    try:
+        (result,) = _send_concurrently([(conversation_id, "check availability for 2026-02-12")])
+    finally:
+        event.remove(async_engine.sync_engine, "checkout", on_checkout)
+
+    assert [call["tool_name"] for call in result["tool_calls"]] == ["check_availability"]
+    assert len(checkouts) == 1
+    assert checked_out_during_tool == [1]
@@ -0,0 +1,103 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+DATE_PATTERN = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+TIME_PATTERN = re.compile(r"\b\d{1,2}(:\d{2})?\s?(am|pm)?\b")
+ALNUM_PATTERN = re.compile(r"[a-z0-9]")
+
+# First matching group wins, as in the original chain of elif checks.
+INTENT_KEYWORDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("booking", ("book", "appointment", "schedule")),
+    ("availability", ("availability", "check", "slot")),
+    ("ticket", ("issue", "ticket", "problem")),
+    ("handoff", ("human", "operator", "agent")),
+)
+HOSTILE_KEYWORDS: Tuple[str, ...] = ("idiot", "stupid", "hate you", "useless", "kill")
+CONFIDENT_KEYWORDS: Tuple[str, ...] = ("book", "appointment", "availability", "ticket", "human")
+# Extra words the decision rules look for.
+DECISION_KEYWORDS: Tuple[str, ...] = ("operator", "issue", "problem", "calendar", "slots", "check")
+RELATIVE_DATES: Tuple[str, ...] = ("tomorrow", "today")
+
+# Substring `in` checks over one deduplicated table beat a single alternation regex here:
+# the regex has to try every keyword at every offset to reproduce substring semantics.
+ALL_KEYWORDS: Tuple[str, ...] = tuple(
+    dict.fromkeys(
+        [word for _, words in INTENT_KEYWORDS for word in words]
+        + list(HOSTILE_KEYWORDS)
+        + list(CONFIDENT_KEYWORDS)
+        + list(DECISION_KEYWORDS)
+        + list(RELATIVE_DATES)
+    )
+)
+
+INTENT_SETS = tuple((name, frozenset(words)) for name, words in INTENT_KEYWORDS)
+HOSTILE_SET = frozenset(HOSTILE_KEYWORDS)
+CONFIDENT_SET = frozenset(CONFIDENT_KEYWORDS)
+
+
+class TextAnalysis(NamedTuple):
+    lowered: str
+    keywords: FrozenSet[str]
+    email: Optional[str]
+    date: Optional[str]
+    time: Optional[str]
+    intent: Optional[str]
+    hostile_hits: Tuple[str, ...]
+    confidence: float
+
+
+def _confidence(normalized: str, keywords: FrozenSet[str]) -> float:
+    if not normalized:
+        return 0.1
+    if not ALNUM_PATTERN.search(normalized):
+        return 0.1
+    if len(normalized) < 4:
+        return 0.25
+    if keywords & CONFIDENT_SET:
+        return 0.9
+    return 0.55
+
+
+@lru_cache(maxsize=512)
+def analyze_message(message: str) -> TextAnalysis:
+    """Scan a user message once for everything the turn needs: slots, intent, hostility and confidence."""
+    lowered = message.lower()
+    keywords = frozenset([word for word in ALL_KEYWORDS if word in lowered])
+
+    # Cheap character checks skip regexes that cannot match; most chat turns carry no email, date or time.
+    email_match = EMAIL_PATTERN.search(message) if "@" in message else None
+    date_match = DATE_PATTERN.search(message) if "-" in message else None
+    if date_match:
+        date = date_match.group(0)
+    else:
+        date = "tomorrow" if "tomorrow" in keywords else "today" if "today" in keywords else None
+    # Only the first time-like token counts, and only when it has minutes.
+    time_match = TIME_PATTERN.search(lowered) if ":" in lowered else None
+    time_value = time_match.group(0).replace(" ", "") if time_match and ":" in time_match.group(0) else None
+
+    intent = None
+    for name, words in INTENT_SETS:
+        if keywords & words:
+            intent = name
+            break
+    return TextAnalysis(
+        lowered=lowered,
+        keywords=keywords,
+        email=email_match.group(0) if email_match else None,
+        date=date,
+        time=time_value,
+        intent=intent,
+        hostile_hits=tuple(word for word in HOSTILE_KEYWORDS if word in keywords) if keywords & HOSTILE_SET else (),
+        confidence=_confidence(" ".join(lowered.split()), keywords),
+    )
+
+
+def merge_slots(analysis: TextAnalysis, existing_slots: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    slots = dict(existing_slots or {})
+    for name in ("email", "date", "time", "intent"):
+        value = getattr(analysis, name)
+        if value is not None:
+            slots[name] = value
+    return slots
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from .database import ToolLog, async_engine
+
+TOOL_LOG_WRITE_BEHIND = os.getenv("TOOL_LOG_WRITE_BEHIND", "false").lower() == "true"
+TOOL_LOG_QUEUE_SIZE = int(os.getenv("TOOL_LOG_QUEUE_SIZE", "10000"))
+TOOL_LOG_BATCH_SIZE = int(os.getenv("TOOL_LOG_BATCH_SIZE", "200"))
+TOOL_LOG_FLUSH_INTERVAL_MS = int(os.getenv("TOOL_LOG_FLUSH_INTERVAL_MS", "50"))
+TOOL_LOG_MAX_RETRIES = int(os.getenv("TOOL_LOG_MAX_RETRIES", "5"))
+
+logger = logging.getLogger(__name__)
+
+ToolLogRow = Dict[str, Any]
+
+_STOP = object()
+
+
+def tool_log_row(log: ToolLog) -> ToolLogRow:
+    """Column values of an unsaved ToolLog, ready for a bulk insert."""
+    return {column.key: getattr(log, column.key) for column in ToolLog.__table__.columns if column.key != "id"}
+
+
+class ToolLogWriter:
+    """Batches tool log inserts off the request path.
+
+    Rows wait in a bounded queue; when it is full, enqueue() waits, so a slow database slows turns
+    down instead of dropping audit rows. stop() drains everything queued before returning.
+    """
+
+    def __init__(
+        self,
+        engine: Any = async_engine,
+        queue_size: int = TOOL_LOG_QUEUE_SIZE,
+        batch_size: int = TOOL_LOG_BATCH_SIZE,
+        flush_interval_seconds: float = TOOL_LOG_FLUSH_INTERVAL_MS / 1000,
+        max_retries: int = TOOL_LOG_MAX_RETRIES,
+        retry_backoff_seconds: float = 0.1,
+    ):
+        self.engine = engine
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping = False
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self) -> None:
+        # The queue and task belong to the running event loop, so they are created here, not in __init__.
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, row: ToolLogRow) -> None:
+        await self._queue.put(row)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        # Rows that raced in behind the stop marker still get written.
+        leftover = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_size):
+            await self._write(leftover[start : start + self.batch_size])
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _insert(self, batch: List[ToolLogRow]) -> None:
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(ToolLog.__table__), batch)
+
+    async def _write(self, batch: List[ToolLogRow]) -> None:
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self._insert(batch)
+            except Exception:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    # Last resort: the rows go to the log so they can be replayed by hand.
+                    logger.exception("tool_log_write_failed rows=%s", json.dumps(batch, default=str))
+                    return
+                self.retries += 1
+                logger.warning("tool_log_write_retry attempt=%s/%s", attempt, self.max_retries, exc_info=True)
+                await asyncio.sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+            else:
+                self.written += len(batch)
+                self.batches += 1
+                return
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+
+TOOL_LOG_WRITER = ToolLogWriter()
@@ -1,6 +1,11 @@
 import asyncio
+import copy
+import json
+import os
 import re
-from typing import Any, Dict, Type
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
 from pydantic import BaseModel, ValidationError
 
@@ -23,6 +28,55 @@ class HandoffInput(BaseModel):
     reason: str
 
 
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+# Short by default: invalidation is per process (see CACHE_INVALIDATES), so the TTL bounds staleness across workers.
+CHECK_AVAILABILITY_CACHE_TTL_SECONDS = float(os.getenv("CHECK_AVAILABILITY_CACHE_TTL_SECONDS", "5"))
+
+
+class ToolResultCache:
+    """Per-process TTL + LRU cache of tool outputs, keyed by tool name and validated input."""
+
+    def __init__(self, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def key(tool_name: str, params: Dict[str, Any]) -> Tuple[str, str]:
+        return tool_name, json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, tool_name: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self.key(tool_name, params)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, output = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        # Callers store outputs in slots/JSON columns; hand out copies so the cached value cannot drift.
+        return copy.deepcopy(output)
+
+    def set(self, tool_name: str, params: Dict[str, Any], output: Dict[str, Any], ttl_seconds: float) -> None:
+        if self.max_entries <= 0 or ttl_seconds <= 0:
+            return
+        key = self.key(tool_name, params)
+        self._entries[key] = (self._clock() + ttl_seconds, copy.deepcopy(output))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, tool_name: str, params: Dict[str, Any]) -> None:
+        self._entries.pop(self.key(tool_name, params), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+TOOL_CACHE = ToolResultCache(TOOL_CACHE_MAX_ENTRIES)
+
+
 class ToolRegistry:
     INPUT_MODELS: Dict[str, Type[BaseModel]] = {
         "check_availability": CheckAvailabilityInput,
@@ -31,6 +85,19 @@ class ToolRegistry:
         "handoff_to_human": HandoffInput,
     }
 
+    # Only idempotent reads belong here; side-effecting tools (create_ticket, book_appointment,
+    # handoff_to_human) are never cached.
+    CACHE_TTL_SECONDS: Dict[str, float] = {
+        "check_availability": CHECK_AVAILABILITY_CACHE_TTL_SECONDS,
+    }
+
+    # A successful call to the key tool drops the listed tool's entry built from these input fields.
+    # Only in this process's TOOL_CACHE: a booking served by another worker does not evict entries
+    # here, so other workers can offer a just-booked slot for up to the listed tool's TTL.
+    CACHE_INVALIDATES: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {
+        "book_appointment": [("check_availability", ("date",))],
+    }
+
     @staticmethod
     async def check_availability(date: str) -> Dict[str, Any]:
         await asyncio.sleep(0.2)
@@ -76,6 +143,20 @@ class ToolRegistry:
 
         return payload
 
+    @staticmethod
+    def cached_output(tool_name: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if tool_name not in ToolRegistry.CACHE_TTL_SECONDS:
+            return None
+        return TOOL_CACHE.get(tool_name, params)
+
+    @staticmethod
+    def record_output(tool_name: str, params: Dict[str, Any], output: Dict[str, Any]) -> None:
+        ttl_seconds = ToolRegistry.CACHE_TTL_SECONDS.get(tool_name)
+        if ttl_seconds:
+            TOOL_CACHE.set(tool_name, params, output, ttl_seconds)
+        for target, fields in ToolRegistry.CACHE_INVALIDATES.get(tool_name, []):
+            TOOL_CACHE.invalidate(target, {field: params[field] for field in fields})
+
     @staticmethod
     async def execute_tool(tool_name: str, **kwargs) -> Dict[str, Any]:
         if tool_name == "check_availability":
@@ -0,0 +1,201 @@
+import asyncio
+import copy
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .database import IdempotencyRecord, async_engine
+
+TURN_LOCK_TIMEOUT_SECONDS = float(os.getenv("TURN_LOCK_TIMEOUT_SECONDS", "30"))
+TURN_ADVISORY_LOCKS = os.getenv("TURN_ADVISORY_LOCKS", "false").lower() == "true"
+TURN_ADVISORY_LOCK_POLL_MS = int(os.getenv("TURN_ADVISORY_LOCK_POLL_MS", "50"))
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", "4096"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+
+
+class TurnLockTimeout(Exception):
+    """Another turn held the conversation's lock for longer than the lock timeout."""
+
+
+def advisory_lock_key(conversation_id: str) -> int:
+    # pg_advisory_lock takes a signed bigint; Python's hash() is salted per process, so it cannot be used.
+    return int.from_bytes(hashlib.blake2b(conversation_id.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class ConversationTurnLocks:
+    """Lets one turn per conversation run at a time.
+
+    An asyncio lock serializes turns within the process. With advisory locks enabled on Postgres, the
+    holder also takes a session-level advisory lock on a pooled connection, so turns on other workers
+    wait too. hold() yields that connection (or None) and the turn must run its session on it, so a
+    turn never needs a second connection. Locks for idle conversations are dropped, so the table only
+    holds busy ones. Raises TurnLockTimeout if the lock is not acquired within timeout_seconds.
+    """
+
+    def __init__(
+        self,
+        engine: Any = async_engine,
+        advisory: bool = TURN_ADVISORY_LOCKS,
+        timeout_seconds: float = TURN_LOCK_TIMEOUT_SECONDS,
+        poll_seconds: float = TURN_ADVISORY_LOCK_POLL_MS / 1000,
+    ):
+        self.engine = engine
+        self.advisory = advisory and engine.dialect.name == "postgresql"
+        self.timeout_seconds = timeout_seconds
+        self.poll_seconds = poll_seconds
+        # conversation id -> [lock, number of turns holding or waiting for it]
+        self._locks: Dict[str, List[Any]] = {}
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: str) -> AsyncIterator[Optional[AsyncConnection]]:
+        deadline = time.monotonic() + self.timeout_seconds
+        entry = self._locks.setdefault(conversation_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), self.timeout_seconds)
+            except asyncio.TimeoutError as exc:
+                raise TurnLockTimeout(conversation_id) from exc
+            try:
+                if self.advisory:
+                    async with self._advisory_lock(conversation_id, deadline) as conn:
+                        yield conn
+                else:
+                    yield None
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[conversation_id]
+
+    @asynccontextmanager
+    async def _advisory_lock(self, conversation_id: str, deadline: float) -> AsyncIterator[AsyncConnection]:
+        key = advisory_lock_key(conversation_id)
+        async with self.engine.connect() as conn:
+            try:
+                locked = await self._try_advisory_lock(conn, key, deadline)
+            except BaseException:
+                # An interrupted lock query may still have taken the lock server-side. Dropping the
+                # connection ends the Postgres session, which releases every advisory lock it held.
+                await conn.invalidate()
+                raise
+            if not locked:
+                raise TurnLockTimeout(conversation_id)
+            try:
+                yield conn
+            finally:
+                await self._advisory_unlock(conn, key)
+
+    async def _try_advisory_lock(self, conn: AsyncConnection, key: int, deadline: float) -> bool:
+        # Polls pg_try_advisory_lock instead of waiting in pg_advisory_lock, so timing out never means
+        # cancelling a query that is still running.
+        while True:
+            locked = (await conn.execute(select(func.pg_try_advisory_lock(key)))).scalar()
+            # A session-level lock outlives the transaction; ending it avoids an "idle in transaction" connection.
+            await conn.commit()
+            if locked:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self.poll_seconds, remaining))
+
+    async def _advisory_unlock(self, conn: AsyncConnection, key: int) -> None:
+        try:
+            if conn.in_transaction():
+                await conn.rollback()
+            unlocked = (await conn.execute(select(func.pg_advisory_unlock(key)))).scalar()
+            await conn.commit()
+        except BaseException:
+            # Never hand a connection that may still hold the lock back to the pool.
+            await conn.invalidate()
+            raise
+        if not unlocked:
+            await conn.invalidate()
+
+
+class IdempotencyCache:
+    """Per-process TTL + LRU cache of turn responses, keyed by conversation id and Idempotency-Key.
+
+    A front for the idempotency_keys table: a retry on the worker that ran the turn is answered from
+    memory, and one on any other worker from the row the turn committed (see find_turn_response).
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 600, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, conversation_id: str, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return (original message content, response) for a key seen before, or None."""
+        entry = self._entries.get((conversation_id, key))
+        if entry is None:
+            return None
+        expires_at, content, response = entry
+        if self._clock() >= expires_at:
+            del self._entries[(conversation_id, key)]
+            return None
+        self._entries.move_to_end((conversation_id, key))
+        return content, copy.deepcopy(response)
+
+    def set(self, conversation_id: str, key: str, content: str, response: Dict[str, Any]) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        self._entries[(conversation_id, key)] = (self._clock() + self.ttl_seconds, content, copy.deepcopy(response))
+        self._entries.move_to_end((conversation_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+async def find_turn_response(
+    db: AsyncSession, conversation_id: str, key: str
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Return (original message content, response) of the turn already run for this key, or None.
+
+    Call it with the conversation's turn lock held: the turn that owns the key commits its row before
+    releasing the lock, so a retry that waited for it always finds the row.
+    """
+    cached = IDEMPOTENCY_CACHE.get(conversation_id, key)
+    if cached is not None:
+        return cached
+    if IDEMPOTENCY_TTL_SECONDS <= 0:
+        return None
+    record = await db.get(IdempotencyRecord, (conversation_id, key))
+    if record is None or record.created_at <= datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS):
+        return None
+    return record.content, copy.deepcopy(record.response)
+
+
+async def record_turn_response(
+    db: AsyncSession, conversation_id: str, key: str, content: str, response: Dict[str, Any]
+) -> None:
+    """Stage the turn's response in the turn's transaction, dropping the conversation's expired keys."""
+    if IDEMPOTENCY_TTL_SECONDS <= 0:
+        return
+    now = datetime.utcnow()
+    await db.execute(
+        delete(IdempotencyRecord).where(
+            IdempotencyRecord.conversation_id == conversation_id,
+            IdempotencyRecord.created_at <= now - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        )
+    )
+    # A live row for this key would have been replayed by find_turn_response, so the insert cannot clash.
+    db.add(
+        IdempotencyRecord(conversation_id=conversation_id, key=key, content=content, response=response, created_at=now)
+    )
+
+
+TURN_LOCKS = ConversationTurnLocks()
+IDEMPOTENCY_CACHE = IdempotencyCache(IDEMPOTENCY_CACHE_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS)
@@ -40,6 +40,10 @@ type UiEvent = {
   latency?: number;
 };
 
+function isToolSuccess(status: ToolLog['status']) {
+  return status === 'success' || status === 'cache_hit';
+}
+
 function formatClock(value: string) {
   return new Date(value).toLocaleTimeString();
 }
@@ -90,7 +94,7 @@ function mapLogsToUiEvents(logs: ToolLog[]): UiEvent[] {
       id: `tool-${log.id}`,
       type: 'tool',
       content: `Executed ${log.tool_name}`,
-      status: log.status === 'timeout' ? 'timeout' : log.status === 'success' ? 'success' : 'error',
+      status: log.status === 'timeout' ? 'timeout' : isToolSuccess(log.status) ? 'success' : 'error',
       latency: log.execution_time_ms,
       timestamp: formatClock(log.created_at),
       toolData: {
@@ -144,14 +148,14 @@ export default function App() {
       const avg = latency.length ? Math.round(latency.reduce((sum, item) => sum + item, 0) / latency.length) : 0;
       setAvgLatencyMs(avg);
 
-      const failures = logs.filter((log) => log.status !== 'success').length;
+      const failures = logs.filter((log) => !isToolSuccess(log.status)).length;
       const errorRate = logs.length ? Math.round((failures / logs.length) * 100) : 0;
       setErrorRatePct(errorRate);
 
       setLatencySeries(logs.slice(-12).map((log) => ({ val: log.execution_time_ms })));
       setErrorSeries(
         logs.slice(-12).map((log) => ({
-          val: log.status === 'success' ? 0 : 1,
+          val: isToolSuccess(log.status) ? 0 : 1,
         })),
       );
     } catch (e) {
@@ -23,7 +23,7 @@ export type ToolLog = {
   input_params: Record<string, unknown>;
   output: Record<string, unknown>;
   execution_time_ms: number;
-  status: 'success' | 'timeout' | 'error' | 'circuit_open';
+  status: 'success' | 'cache_hit' | 'timeout' | 'error' | 'circuit_open';
   error_msg: string | null;
   created_at: string;
 };
@@ -31,12 +31,12 @@ export type ToolLog = {
 export type AgentTurnResponse = {
   response: string;
   tool_calls: Array<{
-    id: number;
+    id: number | null;
     tool_name: string;
     input_json: Record<string, unknown>;
     output_json: Record<string, unknown>;
     duration_ms: number;
-    status: 'success' | 'timeout' | 'error' | 'circuit_open';
+    status: 'success' | 'cache_hit' | 'timeout' | 'error' | 'circuit_open';
     error_msg: string | null;
     created_at: string | null;
   }>;
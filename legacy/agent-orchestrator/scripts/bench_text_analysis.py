@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Compare the single-pass text analysis against the per-function regex/keyword scans it replaced.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "apps"))
+
+from api.text_analysis import analyze_message, merge_slots  # noqa: E402
+
+FRAGMENTS = [
+    "I need to book an appointment",
+    "please check calendar availability for tomorrow",
+    "do you have open slots today",
+    "my email is user{n}@example.com",
+    "2026-02-{day:02d}",
+    "at {hour}:30 pm",
+    "I have an issue with my billing account",
+    "open a ticket for this problem",
+    "can I talk to a human operator",
+    "you are useless",
+    "thanks, that is all",
+    "??",
+]
+
+
+def legacy_extract_slots(message: str, existing_slots: Dict[str, Any] | None) -> Dict[str, Any]:
+    slots = dict(existing_slots or {})
+    lowered = message.lower()
+
+    email_match = re.search(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", message)
+    if email_match:
+        slots["email"] = email_match.group(0)
+
+    date_match = re.search(r"\b\d{4}-\d{2}-\d{2}\b", message)
+    if date_match:
+        slots["date"] = date_match.group(0)
+    elif "tomorrow" in lowered:
+        slots["date"] = "tomorrow"
+    elif "today" in lowered:
+        slots["date"] = "today"
+
+    time_match = re.search(r"\b\d{1,2}(:\d{2})?\s?(am|pm)?\b", lowered)
+    if time_match and ":" in time_match.group(0):
+        slots["time"] = time_match.group(0).replace(" ", "")
+
+    if any(word in lowered for word in ["book", "appointment", "schedule"]):
+        slots["intent"] = "booking"
+    elif any(word in lowered for word in ["availability", "check", "slot"]):
+        slots["intent"] = "availability"
+    elif any(word in lowered for word in ["issue", "ticket", "problem"]):
+        slots["intent"] = "ticket"
+    elif any(word in lowered for word in ["human", "operator", "agent"]):
+        slots["intent"] = "handoff"
+
+    return slots
+
+
+def legacy_confidence_score(content: str) -> float:
+    normalized = re.sub(r"\s+", " ", content.strip().lower())
+    if not normalized:
+        return 0.1
+    if re.fullmatch(r"[^a-z0-9]+", normalized):
+        return 0.1
+    if len(normalized) < 4:
+        return 0.25
+    if any(word in normalized for word in ["book", "appointment", "availability", "ticket", "human"]):
+        return 0.9
+    return 0.55
+
+
+def legacy_turn(message: str) -> tuple:
+    content = message.lower()
+    hostile = any(keyword in content for keyword in ["idiot", "stupid", "hate you", "useless", "kill"])
+    return legacy_extract_slots(message, {}), legacy_confidence_score(content), hostile
+
+
+def single_pass_turn(message: str) -> tuple:
+    # Bypass the lru_cache so every message is actually scanned.
+    analysis = analyze_message.__wrapped__(message)
+    return merge_slots(analysis, {}), analysis.confidence, bool(analysis.hostile_hits)
+
+
+def build_corpus(size: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for n in range(size):
+        parts = rng.sample(FRAGMENTS, rng.randint(1, 3))
+        corpus.append(" ".join(part.format(n=n, day=rng.randint(1, 28), hour=rng.randint(1, 12)) for part in parts))
+    return corpus
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    mismatches = [message for message in corpus if legacy_turn(message) != single_pass_turn(message)]
+    if mismatches:
+        print(f"{len(mismatches)} messages disagree, e.g. {mismatches[0]!r}")
+        return 1
+
+    results = {}
+    for name, fn in (("legacy", legacy_turn), ("single_pass", single_pass_turn)):
+        best = min(timeit.repeat(lambda: [fn(message) for message in corpus], number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"{name:12s} {best * 1e6 / len(corpus):7.2f} us/message")
+    print(f"speedup      {results['legacy'] / results['single_pass']:.2f}x over {len(corpus)} messages")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
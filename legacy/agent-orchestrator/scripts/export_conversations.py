@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Download the NDJSON export of conversations, messages and tool logs from the MVA API.
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CHUNK_BYTES = 64 * 1024
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export MVA conversations as NDJSON.")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="MVA API base URL")
+    parser.add_argument("--since", help="Only conversations created at or after this ISO timestamp")
+    parser.add_argument("--until", help="Only conversations created before this ISO timestamp")
+    parser.add_argument("--status", help="Only conversations with this status (e.g. active, handoff)")
+    parser.add_argument("--gzip", action="store_true", help="Ask the API for a gzip-compressed stream")
+    parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    query = {key: value for key, value in (("since", args.since), ("until", args.until), ("status", args.status)) if value}
+    if args.gzip:
+        query["gzip"] = "true"
+    url = f"{args.base_url.rstrip('/')}/export"
+    if query:
+        url = f"{url}?{urllib.parse.urlencode(query)}"
+
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            if args.output:
+                with open(args.output, "wb") as handle:
+                    shutil.copyfileobj(response, handle, CHUNK_BYTES)
+            else:
+                shutil.copyfileobj(response, sys.stdout.buffer, CHUNK_BYTES)
+    except urllib.error.HTTPError as exc:
+        print(f"Export failed with {exc.code}: {exc.read().decode()}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())